@@ -0,0 +1,221 @@
+import argparse
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+from typing import List, Dict, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+from moviepy.editor import ImageSequenceClip
+
+from text_animator import (TextAnimator, ENCODER_PROFILES, PipelineStats, create_background, encode_frames,
+encode_segments, iter_frames_parallel)
+
+def _measure(render_frame, frames: int) -> Dict:
+"""Run render_frame for a number of frames and collect time, page faults and peak memory"""
+render_frame()
+tracemalloc.start()
+faults_before = resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+start = time.perf_counter()
+
+for _ in range(frames):
+render_frame()
+
+elapsed = time.perf_counter() - start
+faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt - faults_before
+_, peak = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+
+return {
+'ms_per_frame': elapsed * 1000 / frames,
+'page_faults_per_frame': faults / frames,
+'peak_traced_kb': peak / 1024
+}
+
+def benchmark_background_allocations(width: int = 800, height: int = 400, frames: int = 300,
+background: str = '#000000') -> List[Dict]:
+"""Compare per-frame Image.new against copying or reusing a background template"""
+template = create_background(background, width, height)
+scratch = np.empty_like(template)
+
+def pil_frame():
+img = Image.new('RGB', (width, height), background)
+ImageDraw.Draw(img)
+return np.array(img)
+
+def template_copy():
+return template.copy()
+
+def scratch_reuse():
+np.copyto(scratch, template)
+return scratch
+
+results = []
+for name, render_frame in [('Image.new + np.array', pil_frame),
+('template.copy', template_copy),
+('scratch buffer', scratch_reuse)]:
+row = {'method': name}
+row.update(_measure(render_frame, frames))
+results.append(row)
+return results
+
+def benchmark_encoders(style: str = 'matrix', fps: int = 30, duration: float = 3.0,
+backends: Tuple[str, ...] = ('ffmpeg', 'moviepy', 'write_videofile')) -> List[Dict]:
+"""Compare encode throughput of the encoder backends on pre-rendered frames"""
+frames = TextAnimator().create_frames("Benchmark", style, fps=fps, duration=duration)
+
+results = []
+with tempfile.TemporaryDirectory() as tmp_dir:
+for backend in backends:
+output_path = os.path.join(tmp_dir, f"{backend}.mp4")
+start = time.perf_counter()
+if backend == 'write_videofile':
+# The original ImageSequenceClip path, for reference
+ImageSequenceClip(frames, fps=fps).write_videofile(
+output_path, fps=fps, codec='libx264', audio=False, verbose=False, logger=None
+)
+count = len(frames)
+else:
+count = encode_frames(iter(frames), output_path, fps, backend=backend)
+elapsed = time.perf_counter() - start
+results.append({
+'backend': backend,
+'frames': count,
+'seconds': elapsed,
+'encode_fps': count / elapsed,
+'size_kb': os.path.getsize(output_path) / 1024
+})
+return results
+
+def benchmark_profiles(style: str = 'matrix', fps: int = 30, duration: float = 3.0) -> List[Dict]:
+"""Encode the same frames with every encoder profile and compare time against file size"""
+frames = TextAnimator().create_frames("Benchmark", style, fps=fps, duration=duration)
+
+results = []
+with tempfile.TemporaryDirectory() as tmp_dir:
+for profile, settings in ENCODER_PROFILES.items():
+output_path = os.path.join(tmp_dir, f"{profile}.mp4")
+start = time.perf_counter()
+encode_frames(iter(frames), output_path, fps, profile=profile)
+elapsed = time.perf_counter() - start
+results.append({
+'profile': profile,
+'preset': settings['preset'],
+'crf': settings['crf'],
+'seconds': elapsed,
+'encode_fps': len(frames) / elapsed,
+'size_kb': os.path.getsize(output_path) / 1024
+})
+return results
+
+def benchmark_parallel(style: str = 'matrix', fps: int = 30, duration: float = 3.0,
+resolution: str = '1080p') -> List[Dict]:
+"""Compare a serial render against process-pool renders with increasing worker counts"""
+animator = TextAnimator()
+serial = None
+results = []
+for workers in sorted({1, 2, 4, os.cpu_count() or 1}):
+start = time.perf_counter()
+if workers == 1:
+frames = serial = animator.create_frames("Benchmark", style, fps, duration, resolution=resolution)
+else:
+frames = list(iter_frames_parallel("Benchmark", style, fps, duration, resolution, workers=workers))
+elapsed = time.perf_counter() - start
+results.append({
+'workers': workers,
+'seconds': elapsed,
+'render_fps': len(frames) / elapsed,
+'identical': all(np.array_equal(a, b) for a, b in zip(serial, frames))
+})
+return results
+
+def benchmark_pipeline(style: str = 'matrix', fps: int = 30, duration: float = 3.0,
+resolution: str = '720p') -> List[Dict]:
+"""Show per-stage occupancy of the render/convert/encode pipeline, with and without the color stage"""
+animator = TextAnimator()
+results = []
+with tempfile.TemporaryDirectory() as tmp_dir:
+for color_stage in (False, True):
+stats = PipelineStats()
+frames = animator.create_frames_iter("Benchmark", style, fps, duration, resolution=resolution)
+encode_frames(frames, os.path.join(tmp_dir, 'pipeline.mp4'), fps, stats=stats,
+color_stage=color_stage)
+summary = stats.stats()
+for stage, row in summary['stages'].items():
+results.append({
+'color_stage': color_stage,
+'wall_s': summary['wall_s'],
+'stage': stage,
+'busy_s': row['busy_s'],
+'starved_s': row['starved_s'],
+'blocked_s': row['blocked_s'],
+'occupancy': row['occupancy']
+})
+return results
+
+def benchmark_segments(style: str = 'matrix', fps: int = 30, duration: float = 10.0,
+resolution: str = '1080p', profile: str = 'High') -> List[Dict]:
+"""Compare one encoder against GOP-aligned segments encoded in parallel and concatenated"""
+animator = TextAnimator()
+total_frames = int(fps * duration)
+
+def render_range(frame_range):
+return animator.create_frames_iter("Benchmark", style, fps, duration, resolution=resolution,
+frame_range=frame_range)
+
+results = []
+with tempfile.TemporaryDirectory() as tmp_dir:
+for segments in sorted({1, 2, os.cpu_count() or 1}):
+output_path = os.path.join(tmp_dir, f"segments_{segments}.mp4")
+start = time.perf_counter()
+if segments == 1:
+encode_frames(render_range(None), output_path, fps, profile=profile)
+else:
+encode_segments(render_range, total_frames, output_path, fps, profile=profile, segments=segments)
+elapsed = time.perf_counter() - start
+results.append({
+'segments': segments,
+'seconds': elapsed,
+'encode_fps': total_frames / elapsed,
+'size_kb': os.path.getsize(output_path) / 1024
+})
+return results
+
+def print_table(rows: List[Dict]):
+"""Print benchmark rows as an aligned table"""
+columns = list(rows[0].keys())
+cells = [[f"{row[col]:.3f}" if isinstance(row[col], float) else str(row[col]) for col in columns]
+for row in rows]
+widths = [max(len(col), *(len(line[i]) for line in cells)) for i, col in enumerate(columns)]
+print("  ".join(col.ljust(widths[i]) for i, col in enumerate(columns)))
+for line in cells:
+print("  ".join(cell.ljust(widths[i]) for i, cell in enumerate(line)))
+
+def main():
+parser = argparse.ArgumentParser(description="Text animator benchmarks")
+parser.add_argument('benchmark', choices=['backgrounds', 'encoders', 'profiles', 'parallel', 'pipeline', 'segments'])
+parser.add_argument('--width', type=int, default=800)
+parser.add_argument('--height', type=int, default=400)
+parser.add_argument('--frames', type=int, default=300)
+parser.add_argument('--style', default='matrix')
+parser.add_argument('--fps', type=int, default=30)
+parser.add_argument('--duration', type=float, default=3.0)
+args = parser.parse_args()
+
+if args.benchmark == 'backgrounds':
+print_table(benchmark_background_allocations(args.width, args.height, args.frames))
+elif args.benchmark == 'encoders':
+print_table(benchmark_encoders(args.style, args.fps, args.duration))
+elif args.benchmark == 'profiles':
+print_table(benchmark_profiles(args.style, args.fps, args.duration))
+elif args.benchmark == 'parallel':
+print_table(benchmark_parallel(args.style, args.fps, args.duration))
+elif args.benchmark == 'pipeline':
+print_table(benchmark_pipeline(args.style, args.fps, args.duration))
+elif args.benchmark == 'segments':
+print_table(benchmark_segments(args.style, args.fps, args.duration))
+
+if __name__ == "__main__":
+main()
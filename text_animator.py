@@ -1,17 +1,50 @@
 import streamlit as st
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw, ImageFont, ImageColor, ImageFilter
 import numpy as np
-from moviepy.editor import VideoFileClip, ImageSequenceClip, CompositeVideoClip, ColorClip, TextClip
+from moviepy.editor import VideoFileClip, CompositeVideoClip, ColorClip, TextClip, VideoClip
 import tempfile
 import os
 from pathlib import Path
 import time
-import random
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional, Iterator, Callable, Union
 import json
 import base64
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
+from contextlib import contextmanager
 import io
+import zlib
+import sqlite3
+import uuid
+import string
+import hashlib
+import importlib
+import threading
+import weakref
+import queue
+import shutil
+import subprocess
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from multiprocessing import shared_memory
+from functools import lru_cache
+
+MATRIX_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789@#$%&*"
+
+# Bump whenever a change alters rendered or encoded output, so cached videos are not reused
+RENDERER_VERSION = 2
+
+# Style sizes (fonts, bounce height, matrix grid, glow) are designed for this frame size
+REFERENCE_RESOLUTION = (800, 400)
+RESOLUTIONS = {
+'720p': (1280, 720),
+'1080p': (1920, 1080)
+}
+
+def render_scale(width: int, height: int) -> float:
+"""Return how much style sizes grow from the reference resolution to width x height"""
+return min(width / REFERENCE_RESOLUTION[0], height / REFERENCE_RESOLUTION[1])
 
 @dataclass
 class AnimationStyle:
@@ -22,8 +55,490 @@ background: str
 animation_type: str
 duration: float
 
+@dataclass
+class TextLayout:
+text: str
+advances: List[float]
+char_offsets: List[int]
+char_tops: List[int]
+bbox: Tuple[int, int, int, int]
+origin: Tuple[int, int]
+
+# Extra pixels between lines, PIL's multiline default
+LINE_SPACING = 4
+
+def compute_text_layout(font, text: str, width: int, height: int) -> TextLayout:
+"""Measure text once: per-character advances, kerned offsets, line tops, bbox and centered origin"""
+advances = [font.getlength(char) for char in text]
+
+# Lines are left-aligned and spaced like PIL's multiline_text
+line_spacing = font.getbbox("A")[3] + LINE_SPACING
+char_offsets = []
+char_tops = []
+bbox = None
+start = 0
+for line_index, line in enumerate(text.split('\n')):
+top = line_index * line_spacing
+
+# Kerning between neighbours is whatever the pair adds to the sum of its advances
+pen_x = 0.0
+for j, char in enumerate(line):
+char_offsets.append(round(pen_x))
+char_tops.append(top)
+pen_x += advances[start + j]
+if j + 1 < len(line):
+pen_x += font.getlength(line[j:j + 2]) - advances[start + j] - advances[start + j + 1]
+
+# The newline itself sits at the end of its line and draws nothing
+if start + len(line) < len(text):
+char_offsets.append(round(pen_x))
+char_tops.append(top)
+start += len(line) + 1
+
+left, line_top, right, bottom = font.getbbox(line) if line else (0, 0, 0, 0)
+line_bbox = (left, line_top + top, right, bottom + top)
+if bbox is None:
+bbox = line_bbox
+else:
+bbox = (min(bbox[0], line_bbox[0]), min(bbox[1], line_bbox[1]),
+max(bbox[2], line_bbox[2]), max(bbox[3], line_bbox[3]))
+
+if not text:
+bbox = (0, 0, 0, 0)
+x = (width - (bbox[2] - bbox[0])) // 2
+y = (height - (bbox[3] - bbox[1])) // 2
+return TextLayout(text, advances, char_offsets, char_tops, bbox, (x, y))
+
+@lru_cache(maxsize=256)
+def hex_to_rgb(color: str) -> Tuple[int, int, int]:
+"""Convert a color string such as '#FF1493' to an RGB tuple"""
+return ImageColor.getrgb(color)[:3]
+
+@lru_cache(maxsize=16)
+def create_background(background: str, width: int, height: int) -> np.ndarray:
+"""Build a read-only background template: a color, 'color1,color2' gradient or image path"""
+if os.path.isfile(background):
+img = Image.open(background).convert('RGB').resize((width, height))
+template = np.array(img)
+elif ',' in background:
+# Vertical gradient through the listed colors
+stops = np.array([hex_to_rgb(color.strip()) for color in background.split(',')], dtype=np.float32)
+positions = np.linspace(0, len(stops) - 1, height)
+lower = np.minimum(positions.astype(int), len(stops) - 2)
+weight = (positions - lower)[:, None]
+rows = stops[lower] * (1 - weight) + stops[lower + 1] * weight
+template = np.repeat(np.rint(rows).astype(np.uint8)[:, None, :], width, axis=1)
+else:
+template = np.empty((height, width, 3), dtype=np.uint8)
+template[...] = hex_to_rgb(background)
+
+template.flags.writeable = False
+return template
+
+def create_glow_mask(mask: np.ndarray, radius: int = 3) -> Tuple[np.ndarray, int]:
+"""Dilate and blur a text mask into a glow mask, returning it with the padding added on each side"""
+pad = radius * 3
+img = Image.fromarray(np.pad(mask, pad))
+img = img.filter(ImageFilter.MaxFilter(2 * radius + 1))
+img = img.filter(ImageFilter.GaussianBlur(radius))
+return np.asarray(img), pad
+
+def clip_region(target_shape: Tuple[int, ...], source_shape: Tuple[int, ...], x: int, y: int):
+"""Return matching (target, source) slices for a source placed at (x, y), or None"""
+x0, y0 = max(x, 0), max(y, 0)
+x1, y1 = min(x + source_shape[1], target_shape[1]), min(y + source_shape[0], target_shape[0])
+if x0 >= x1 or y0 >= y1:
+return None
+return (slice(y0, y1), slice(x0, x1)), (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+
+def blend_mask(frame: np.ndarray, mask: np.ndarray, x: int, y: int, color):
+"""Blend a color, or a per-pixel (h, w, 3) color array matching mask, into frame through mask at (x, y)"""
+regions = clip_region(frame.shape, mask.shape, x, y)
+if regions is None:
+return
+
+target, source = regions
+alpha = mask[source]
+region = frame[target]
+ink = np.asarray(color, dtype=np.uint16)
+if ink.ndim == 3:
+ink = ink[source]
+
+# Mostly empty masks (such as matrix rain) only touch their covered pixels
+if np.count_nonzero(alpha) * 4 < alpha.size:
+index = np.nonzero(alpha)
+alpha = alpha[index][:, None].astype(np.uint16)
+if ink.ndim == 3:
+ink = ink[index]
+else:
+index = Ellipsis
+alpha = alpha[..., None].astype(np.uint16)
+
+blended = region[index].astype(np.uint16)
+blended *= 255 - alpha
+blended += ink * alpha
+blended += 127
+blended //= 255
+region[index] = blended
+
+class GlyphAtlas:
+"""Alpha masks for the glyphs of one font, rasterized once per character"""
+
+def __init__(self, font, max_strings: int = 64):
+self.font = font
+self.max_strings = max_strings
+self._glyphs = {}
+self._strings = OrderedDict()
+self._lock = threading.Lock()
+
+def _rasterize(self, char: str) -> Tuple[np.ndarray, Tuple[int, int]]:
+"""Draw a single character into an 'L' mask and return it with its offset"""
+left, top, right, bottom = self.font.getbbox(char)
+if char == '\n' or right <= left or bottom <= top:
+return np.zeros((0, 0), dtype=np.uint8), (0, 0)
+
+img = Image.new('L', (right - left, bottom - top), 0)
+ImageDraw.Draw(img).text((-left, -top), char, font=self.font, fill=255)
+return np.asarray(img), (left, top)
+
+def add(self, chars: str):
+"""Rasterize any characters that are not in the atlas yet"""
+with self._lock:
+for char in set(chars) - self._glyphs.keys():
+self._glyphs[char] = self._rasterize(char)
+
+def glyph(self, char: str) -> Tuple[np.ndarray, Tuple[int, int]]:
+"""Return the mask and (dx, dy) offset of a character"""
+if char not in self._glyphs:
+self.add(char)
+return self._glyphs[char]
+
+def text_mask(self, layout: TextLayout, count: Optional[int] = None) -> Tuple[np.ndarray, Tuple[int, int]]:
+"""Composite the first count glyphs of a layout into one mask and return it with its offset"""
+text = layout.text[:count]
+key = (layout.text, len(text))
+with self._lock:
+if key in self._strings:
+self._strings.move_to_end(key)
+return self._strings[key]
+
+self.add(text)
+placed = []
+for char, char_x, char_y in zip(text, layout.char_offsets, layout.char_tops):
+glyph_mask, (dx, dy) = self._glyphs[char]
+if glyph_mask.size:
+placed.append((glyph_mask, char_x + dx, char_y + dy))
+
+if not placed:
+return np.zeros((0, 0), dtype=np.uint8), (0, 0)
+
+left = min(gx for _, gx, _ in placed)
+top = min(gy for _, _, gy in placed)
+right = max(gx + glyph_mask.shape[1] for glyph_mask, gx, _ in placed)
+bottom = max(gy + glyph_mask.shape[0] for glyph_mask, _, gy in placed)
+mask = np.zeros((bottom - top, right - left), dtype=np.uint8)
+for glyph_mask, gx, gy in placed:
+regions = clip_region(mask.shape, glyph_mask.shape, gx - left, gy - top)
+if regions is not None:
+target, source = regions
+np.maximum(mask[target], glyph_mask[source], out=mask[target])
+
+with self._lock:
+self._strings[key] = (mask, (left, top))
+while len(self._strings) > self.max_strings:
+self._strings.popitem(last=False)
+return mask, (left, top)
+
+def label_map(self, layout: TextLayout) -> Tuple[np.ndarray, np.ndarray, Tuple[int, int]]:
+"""Render a layout once into a per-pixel character index and coverage, with its offset"""
+mask, (left, top) = self.text_mask(layout)
+labels = np.zeros(mask.shape, dtype=np.intp)
+coverage = np.zeros(mask.shape, dtype=np.uint8)
+
+# Where glyphs overlap the pixel belongs to the one covering it most
+for j, (char, char_x, char_y) in enumerate(zip(layout.text, layout.char_offsets, layout.char_tops)):
+glyph_mask, (dx, dy) = self.glyph(char)
+regions = clip_region(mask.shape, glyph_mask.shape, char_x + dx - left, char_y + dy - top)
+if regions is not None:
+target, source = regions
+stronger = glyph_mask[source] > coverage[target]
+labels[target][stronger] = j
+coverage[target][stronger] = glyph_mask[source][stronger]
+
+return labels, coverage, (left, top)
+
+class MatrixRain:
+"""Matrix rain as falling columns whose state is a pure function of time"""
+
+def __init__(self, width: int, height: int, atlas: GlyphAtlas, seed: int = 0,
+charset: str = MATRIX_CHARS, col_pitch: int = 20, row_pitch: int = 30):
+self.width = width
+self.height = height
+self.col_pitch = col_pitch
+self.row_pitch = row_pitch
+self.cols = len(range(0, width, col_pitch))
+self.rows = len(range(0, height, row_pitch))
+
+# Column state: head start, fall speed (rows/s), trail length, pause and glyph flicker
+rng = np.random.default_rng(seed)
+self.trail = rng.integers(2, max(self.rows // 3, 3) + 1, self.cols)
+self.cycle = self.rows + self.trail + rng.integers(0, self.rows * 2 + 1, self.cols)
+self.start = rng.uniform(0, self.cycle)
+self.speed = rng.uniform(6, 18, self.cols)
+self.glyph_base = rng.integers(0, len(charset), (self.rows, self.cols))
+self.glyph_rate = rng.uniform(0, 8, (self.rows, self.cols))
+self.row_fade = 1 - np.arange(self.rows) * row_pitch / height
+
+# Glyph tiles share one box so a whole grid can be laid out with a reshape
+atlas.add(charset)
+glyphs = [atlas.glyph(char) for char in charset]
+placed = [(mask, dx, dy) for mask, (dx, dy) in glyphs if mask.size]
+self.left = min(dx for _, dx, _ in placed)
+self.top = min(dy for _, _, dy in placed)
+tile_w = max(dx + mask.shape[1] for mask, dx, _ in placed) - self.left
+tile_h = max(dy + mask.shape[0] for mask, _, dy in placed) - self.top
+
+# Cells this many columns/rows apart never overlap
+self.col_step = -(-tile_w // col_pitch)
+self.row_step = -(-tile_h // row_pitch)
+self.tiles = np.zeros((len(charset), self.row_step * row_pitch, self.col_step * col_pitch), dtype=np.uint16)
+for index, (mask, (dx, dy)) in enumerate(glyphs):
+if mask.size:
+y0, x0 = dy - self.top, dx - self.left
+self.tiles[index, y0:y0 + mask.shape[0], x0:x0 + mask.shape[1]] = mask
+
+def cell_state(self, t: float) -> Tuple[np.ndarray, np.ndarray]:
+"""Return per-cell brightness (0-255) and glyph index at time t"""
+head = (self.start + self.speed * t) % self.cycle
+behind = head[None, :] - np.arange(self.rows)[:, None]
+lit = (behind >= 0) & (behind < self.trail[None, :])
+brightness = np.where(lit, 1 - behind / self.trail[None, :], 0) * self.row_fade[:, None]
+glyphs = (self.glyph_base + (self.glyph_rate * t).astype(int)) % len(self.tiles)
+return (brightness * 255).astype(np.uint16), glyphs
+
+def render_mask(self, t: float) -> np.ndarray:
+"""Composite the rain at time t into one alpha mask the size of the frame"""
+brightness, glyphs = self.cell_state(t)
+mask = np.zeros((self.height, self.width), dtype=np.uint8)
+lit_rows, lit_cols = np.nonzero(brightness)
+cells = (self.tiles[glyphs[lit_rows, lit_cols]] * brightness[lit_rows, lit_cols, None, None] // 255).astype(np.uint8)
+tile_h, tile_w = self.tiles.shape[1:]
+n_rows = -(-self.rows // self.row_step)
+n_cols = -(-self.cols // self.col_step)
+
+for row0 in range(self.row_step):
+for col0 in range(self.col_step):
+# Lay out the lit cells of one non-overlapping phase of the grid in a single scatter
+phase = (lit_rows % self.row_step == row0) & (lit_cols % self.col_step == col0)
+if not phase.any():
+continue
+layer = np.zeros((n_rows, tile_h, n_cols, tile_w), dtype=np.uint8)
+layer[lit_rows[phase] // self.row_step, :, lit_cols[phase] // self.col_step, :] = cells[phase]
+layer = layer.reshape(n_rows * tile_h, n_cols * tile_w)
+
+regions = clip_region(mask.shape, layer.shape,
+col0 * self.col_pitch + self.left, row0 * self.row_pitch + self.top)
+if regions is not None:
+target, source = regions
+np.maximum(mask[target], layer[source], out=mask[target])
+
+return mask
+
+class FontCache:
+"""Bounded LRU cache of loaded fonts shared by every TextAnimator"""
+
+def __init__(self, max_size: int = 32):
+self.max_size = max_size
+self._fonts = OrderedDict()
+self._atlases = {}
+self._lock = threading.Lock()
+self.hits = 0
+self.misses = 0
+self.failures = 0
+
+def get_font(self, font_path: str, font_size: int):
+"""Return the font for (path, size), loading it on first use"""
+key = (font_path, font_size)
+with self._lock:
+if key in self._fonts:
+self._fonts.move_to_end(key)
+self.hits += 1
+return self._fonts[key]
+self.misses += 1
+
+try:
+font = ImageFont.truetype(font_path, font_size)
+except OSError:
+# Cache the fallback too so a missing font only fails once
+font = ImageFont.load_default()
+with self._lock:
+self.failures += 1
+
+with self._lock:
+self._fonts[key] = font
+self._fonts.move_to_end(key)
+while len(self._fonts) > self.max_size:
+evicted, _ = self._fonts.popitem(last=False)
+self._atlases.pop(evicted, None)
+return font
+
+def get_atlas(self, font_path: str, font_size: int) -> GlyphAtlas:
+"""Return the glyph atlas for (path, size), creating it on first use"""
+font = self.get_font(font_path, font_size)
+key = (font_path, font_size)
+with self._lock:
+atlas = self._atlases.get(key)
+if atlas is None or atlas.font is not font:
+atlas = self._atlases[key] = GlyphAtlas(font)
+return atlas
+
+def stats(self) -> Dict:
+"""Return hit/miss counters for the cache"""
+with self._lock:
+lookups = self.hits + self.misses
+return {
+'size': len(self._fonts),
+'max_size': self.max_size,
+'atlases': len(self._atlases),
+'hits': self.hits,
+'misses': self.misses,
+'failures': self.failures,
+'hit_ratio': self.hits / lookups if lookups else 0.0
+}
+
+def clear(self):
+"""Drop all cached fonts and reset the counters"""
+with self._lock:
+self._fonts.clear()
+self._atlases.clear()
+self.hits = self.misses = self.failures = 0
+
+@st.cache_resource
+def get_font_cache() -> FontCache:
+"""Get the process-wide font cache shared across sessions"""
+return FontCache()
+
+class FrameSequence:
+"""Run-length frame sequence: each distinct frame stored once plus the frame index shown at every position"""
+
+def __init__(self, frames: List[np.ndarray], indices: List[int], fps: int):
+self.frames = frames
+self.indices = np.asarray(indices, dtype=np.intp)
+self.fps = fps
+
+@classmethod
+def from_frames(cls, frames: List[np.ndarray], fps: int) -> 'FrameSequence':
+"""Build a sequence from a frame list in which repeated frames share one array"""
+unique = []
+positions = {}
+indices = []
+for frame in frames:
+if id(frame) not in positions:
+positions[id(frame)] = len(unique)
+unique.append(frame)
+indices.append(positions[id(frame)])
+return cls(unique, indices, fps)
+
+def __len__(self) -> int:
+return len(self.indices)
+
+def __getitem__(self, index: int) -> np.ndarray:
+return self.frames[self.indices[index]]
+
+def __iter__(self):
+for index in self.indices:
+yield self.frames[index]
+
+@property
+def duration(self) -> float:
+return len(self) / self.fps
+
+@property
+def nbytes(self) -> int:
+return sum(frame.nbytes for frame in self.frames)
+
+def runs(self) -> List[Tuple[int, int]]:
+"""Return (frame index, repeat count) for each run of identical frames"""
+runs = []
+for index in self.indices:
+if runs and runs[-1][0] == index:
+runs[-1][1] += 1
+else:
+runs.append([int(index), 1])
+return [tuple(run) for run in runs]
+
+def expand(self) -> List[np.ndarray]:
+"""Return one list entry per frame, still sharing the stored arrays"""
+return [self.frames[index] for index in self.indices]
+
+def to_clip(self) -> VideoClip:
+"""Wrap the sequence in a moviepy clip that looks frames up instead of holding them all"""
+def make_frame(t):
+return self[min(int(round(t * self.fps)), len(self) - 1)]
+
+return VideoClip(make_frame, duration=self.duration)
+
+def frame_buffer_shape(fps: int, duration: float, width: int, height: int) -> Tuple[int, int, int, int]:
+"""Return the (N, H, W, 3) uint8 buffer create_frames fills for a job"""
+return (int(fps * duration), height, width, 3)
+
+def estimate_frame_memory(fps: int, duration: float, width: int, height: int) -> int:
+"""Return the bytes needed to hold every RGB frame of a job, before allocating any of them"""
+return int(np.prod(frame_buffer_shape(fps, duration, width, height)))
+
+class FrameBufferPool:
+"""Pool of contiguous frame buffers reused across jobs"""
+
+def __init__(self, max_bytes: int = 2 * 1024 ** 3):
+self.max_bytes = max_bytes
+self._free = []
+self._lock = threading.Lock()
+self.allocations = 0
+self.reuses = 0
+
+def acquire(self, shape: Tuple[int, ...]) -> np.ndarray:
+"""Return an uninitialised uint8 array of the given shape"""
+needed = int(np.prod(shape))
+with self._lock:
+candidates = [buf for buf in self._free if buf.size >= needed]
+if candidates:
+storage = min(candidates, key=lambda buf: buf.size)
+self._free.remove(storage)
+self.reuses += 1
+return storage[:needed].reshape(shape)
+self.allocations += 1
+return np.empty(needed, dtype=np.uint8).reshape(shape)
+
+def release(self, buffer: np.ndarray):
+"""Give a buffer returned by acquire back to the pool"""
+storage = buffer
+while isinstance(storage.base, np.ndarray):
+storage = storage.base
+storage = storage.reshape(-1)
+
+with self._lock:
+if any(buf is storage or np.shares_memory(buf, storage) for buf in self._free):
+return
+self._free.append(storage)
+# Keep the largest buffers within the byte budget
+self._free.sort(key=lambda buf: buf.nbytes, reverse=True)
+while sum(buf.nbytes for buf in self._free) > self.max_bytes:
+self._free.pop()
+
+def stats(self) -> Dict:
+"""Return allocation counters and the bytes currently pooled"""
+with self._lock:
+return {
+'allocations': self.allocations,
+'reuses': self.reuses,
+'pooled_buffers': len(self._free),
+'pooled_bytes': sum(buf.nbytes for buf in self._free),
+'max_bytes': self.max_bytes
+}
+
 class TextAnimator:
 def __init__(self):
+self.font_cache = get_font_cache()
 self.styles = {
 'neon': AnimationStyle(
 'Neon Glow',
@@ -67,140 +582,1502 @@ self.styles = {
 )
 }
 
-def create_base_frame(self, text: str, width: int, height: int, style: AnimationStyle) -> Image.Image:
-"""Create a base frame with the given text and style"""
-img = Image.new('RGB', (width, height), style.background)
-draw = ImageDraw.Draw(img)
-
-try:
-font = ImageFont.truetype('arial.ttf', style.font_size)
-except:
-font = ImageFont.load_default()
+def font_size(self, width: int, height: int, style: AnimationStyle) -> int:
+"""Scale a style's font size from the reference resolution to width x height"""
+return max(1, round(style.font_size * render_scale(width, height)))
+
+def get_font_file(self, resolution: Optional[str], style: AnimationStyle) -> Optional[str]:
+"""Return the file a style's font was actually loaded from, or None when PIL's default font stands in"""
+width, height = RESOLUTIONS[resolution] if resolution else REFERENCE_RESOLUTION
+font = self.font_cache.get_font('arial.ttf', self.font_size(width, height, style))
+# truetype() records the system font directory path it found the name in
+path = getattr(font, 'path', None)
+return os.path.abspath(path) if isinstance(path, str) else None
+
+def get_layout(self, text: str, width: int, height: int, style: AnimationStyle) -> TextLayout:
+"""Measure text once for a whole job"""
+font = self.font_cache.get_font('arial.ttf', self.font_size(width, height, style))
+return compute_text_layout(font, text, width, height)
+
+def get_background(self, width: int, height: int, style: AnimationStyle) -> np.ndarray:
+"""Get the shared background template every frame of a job starts from"""
+return create_background(style.background, width, height)
+
+def get_atlas(self, width: int, height: int, style: AnimationStyle) -> GlyphAtlas:
+"""Get the shared glyph atlas for a style's font at width x height"""
+return self.font_cache.get_atlas('arial.ttf', self.font_size(width, height, style))
+
+def collect_frames(self, frames: Iterator[np.ndarray], out: Optional[np.ndarray] = None) -> List[np.ndarray]:
+"""Gather frames from an effect iterator, copying them into out when a frame buffer is used"""
+collected = []
+for index, frame in enumerate(frames):
+if out is not None:
+np.copyto(out[index], frame)
+frame = out[index]
+collected.append(frame)
+return collected
+
+def create_frames_iter(self, text: str, style: str, fps: int = 30, duration: float = 3.0,
+resolution: Optional[str] = None, frame_range: Optional[range] = None,
+workers: int = 1) -> Iterator[np.ndarray]:
+"""Yield animation frames one at a time; repeated frames are yielded as the same array"""
+if workers > 1 and style in PARALLEL_STYLES:
+return iter_frames_parallel(text, style, fps, duration, resolution, workers, frame_range=frame_range)
+
+width, height = RESOLUTIONS[resolution] if resolution else REFERENCE_RESOLUTION
+style_config = self.styles[style]
+effects = {
+'typewriter': self.iter_typewriter_effect,
+'bounce': self.iter_bounce_effect,
+'matrix': self.iter_matrix_effect,
+'rainbow': self.iter_rainbow_effect,
+'neon': self.iter_neon_effect
+}
+return effects[style](text, width, height, style_config, fps, duration, frame_range)
 
-# Calculate text position to center it
-bbox = draw.textbbox((0, 0), text, font=font)
-text_width = bbox[2] - bbox[0]
-text_height = bbox[3] - bbox[1]
-x = (width - text_width) // 2
-y = (height - text_height) // 2
+def create_frames(self, text: str, style: str, fps: int = 30, duration: float = 3.0,
+out: Optional[np.ndarray] = None, buffer_pool: Optional[FrameBufferPool] = None,
+compact: bool = False, resolution: Optional[str] = None, workers: int = 1) -> List[np.ndarray]:
+"""Create animation frames based on the selected style, into out/buffer_pool or as a compact FrameSequence"""
+width, height = RESOLUTIONS[resolution] if resolution else REFERENCE_RESOLUTION
 
-return img, draw, font, (x, y)
+if compact and (out is not None or buffer_pool is not None):
+raise ValueError("compact frames cannot be written into a frame buffer")
 
-def create_frames(self, text: str, style: str, fps: int = 30, duration: float = 3.0) -> List[np.ndarray]:
-"""Create animation frames based on the selected style"""
-width, height = 800, 400
-frames = []
-style_config = self.styles[style]
+shape = frame_buffer_shape(fps, duration, width, height)
+if out is None and buffer_pool is not None:
+out = buffer_pool.acquire(shape)
+if out is not None and (out.shape != shape or out.dtype != np.uint8):
+raise ValueError(f"Frame buffer must be uint8 with shape {shape}, got {out.dtype} {out.shape}")
 
-if style == 'typewriter':
-frames.extend(self.create_typewriter_effect(text, width, height, style_config, fps, duration))
-elif style == 'bounce':
-frames.extend(self.create_bounce_effect(text, width, height, style_config, fps, duration))
-elif style == 'matrix':
-frames.extend(self.create_matrix_effect(text, width, height, style_config, fps, duration))
-elif style == 'rainbow':
-frames.extend(self.create_rainbow_effect(text, width, height, style_config, fps, duration))
-elif style == 'neon':
-frames.extend(self.create_neon_effect(text, width, height, style_config, fps, duration))
+frames = self.collect_frames(
+self.create_frames_iter(text, style, fps, duration, resolution, workers=workers), out
+)
 
-return frames
+if compact:
+return FrameSequence.from_frames(frames, fps)
+return frames if out is None else out
 
 def create_typewriter_effect(self, text: str, width: int, height: int,
-style: AnimationStyle, fps: int, duration: float) -> List[np.ndarray]:
-frames = []
+style: AnimationStyle, fps: int, duration: float,
+out: Optional[np.ndarray] = None) -> List[np.ndarray]:
+return self.collect_frames(self.iter_typewriter_effect(text, width, height, style, fps, duration), out)
+
+def iter_typewriter_effect(self, text: str, width: int, height: int,
+style: AnimationStyle, fps: int, duration: float,
+frame_range: Optional[range] = None) -> Iterator[np.ndarray]:
 total_frames = int(fps * duration)
 chars_per_frame = max(1, len(text) // total_frames)
 
-for i in range(total_frames):
-img, draw, font, (x, y) = self.create_base_frame(text, width, height, style)
-visible_chars = text[:int(i * chars_per_frame)]
-draw.text((x, y), visible_chars, font=font, fill=style.colors[0])
-frames.append(np.array(img))
-
-return frames
+layout = self.get_layout(text, width, height, style)
+background = self.get_background(width, height, style)
+x, y = layout.origin
+atlas = self.get_atlas(width, height, style)
+atlas.add(text)
+color = hex_to_rgb(style.colors[0])
+
+# Each distinct prefix is rendered once by stamping only the newly revealed
+# glyphs onto the previous one; repeated frames share the same array
+frame = background.copy()
+shown = 0
+for i in (range(total_frames) if frame_range is None else frame_range):
+visible = min(int(i * chars_per_frame), len(text))
+if visible != shown:
+revealed = range(shown, visible)
+if any(atlas.glyph(text[j])[0].size for j in revealed):
+frame = frame.copy()
+for j in revealed:
+glyph_mask, (gx, gy) = atlas.glyph(text[j])
+blend_mask(frame, glyph_mask, x + layout.char_offsets[j] + gx,
+y + layout.char_tops[j] + gy, color)
+shown = visible
+
+yield frame
 
 def create_bounce_effect(self, text: str, width: int, height: int,
-style: AnimationStyle, fps: int, duration: float) -> List[np.ndarray]:
-frames = []
-total_frames = int(fps * duration)
+style: AnimationStyle, fps: int, duration: float,
+out: Optional[np.ndarray] = None) -> List[np.ndarray]:
+return self.collect_frames(self.iter_bounce_effect(text, width, height, style, fps, duration), out)
 
-for i in range(total_frames):
-img, draw, font, (x, y) = self.create_base_frame(text, width, height, style)
-offset = int(20 * np.sin(2 * np.pi * i / fps))
-draw.text((x, y + offset), text, font=font, fill=style.colors[0])
-frames.append(np.array(img))
+def iter_bounce_effect(self, text: str, width: int, height: int,
+style: AnimationStyle, fps: int, duration: float,
+frame_range: Optional[range] = None) -> Iterator[np.ndarray]:
+total_frames = int(fps * duration)
 
-return frames
+layout = self.get_layout(text, width, height, style)
+background = self.get_background(width, height, style)
+x, y = layout.origin
+mask, (dx, dy) = self.get_atlas(width, height, style).text_mask(layout)
+color = hex_to_rgb(style.colors[0])
+
+# The offset repeats every fps frames, so only one period is ever rendered
+# and each distinct offset is blitted once
+amplitude = 20 * render_scale(width, height)
+offsets = [int(amplitude * np.sin(2 * np.pi * i / fps)) for i in range(fps)]
+rendered = {}
+for i in (range(total_frames) if frame_range is None else frame_range):
+offset = offsets[i % fps]
+if offset not in rendered:
+frame = background.copy()
+blend_mask(frame, mask, x + dx, y + dy + offset, color)
+rendered[offset] = frame
+yield rendered[offset]
 
 def create_matrix_effect(self, text: str, width: int, height: int,
-style: AnimationStyle, fps: int, duration: float) -> List[np.ndarray]:
-frames = []
+style: AnimationStyle, fps: int, duration: float,
+out: Optional[np.ndarray] = None) -> List[np.ndarray]:
+return self.collect_frames(self.iter_matrix_effect(text, width, height, style, fps, duration), out)
+
+def iter_matrix_effect(self, text: str, width: int, height: int,
+style: AnimationStyle, fps: int, duration: float,
+frame_range: Optional[range] = None) -> Iterator[np.ndarray]:
 total_frames = int(fps * duration)
-matrix_chars = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789@#$%&*"
 
-for i in range(total_frames):
-img, draw, font, (x, y) = self.create_base_frame(text, width, height, style)
+layout = self.get_layout(text, width, height, style)
+background = self.get_background(width, height, style)
+x, y = layout.origin
+atlas = self.get_atlas(width, height, style)
+mask, (dx, dy) = atlas.text_mask(layout)
+color = hex_to_rgb(style.colors[0])
+
+# Seeded from the text so the same request always rains the same way
+scale = render_scale(width, height)
+rain = MatrixRain(width, height, atlas, seed=zlib.crc32(text.encode()),
+col_pitch=max(1, round(20 * scale)), row_pitch=max(1, round(30 * scale)))
+
+for i in (range(total_frames) if frame_range is None else frame_range):
+frame = background.copy()
 
 # Create matrix rain effect
-for col in range(0, width, 20):
-for row in range(0, height, 30):
-if random.random() < 0.1:
-char = random.choice(matrix_chars)
-opacity = int(255 * (1 - row/height))
-color = f"#{0:02x}{opacity:02x}{0:02x}"
-draw.text((col, row), char, font=font, fill=color)
+blend_mask(frame, rain.render_mask(i / fps), 0, 0, color)
 
 # Draw main text
-draw.text((x, y), text, font=font, fill=style.colors[0])
-frames.append(np.array(img))
-
-return frames
+blend_mask(frame, mask, x + dx, y + dy, color)
+yield frame
 
 def create_rainbow_effect(self, text: str, width: int, height: int,
-style: AnimationStyle, fps: int, duration: float) -> List[np.ndarray]:
-frames = []
+style: AnimationStyle, fps: int, duration: float,
+out: Optional[np.ndarray] = None) -> List[np.ndarray]:
+return self.collect_frames(self.iter_rainbow_effect(text, width, height, style, fps, duration), out)
+
+def iter_rainbow_effect(self, text: str, width: int, height: int,
+style: AnimationStyle, fps: int, duration: float,
+frame_range: Optional[range] = None) -> Iterator[np.ndarray]:
 total_frames = int(fps * duration)
 
-for i in range(total_frames):
-img, draw, font, (x, y) = self.create_base_frame(text, width, height, style)
+layout = self.get_layout(text, width, height, style)
+background = self.get_background(width, height, style)
+x, y = layout.origin
+labels, coverage, (dx, dy) = self.get_atlas(width, height, style).label_map(layout)
+palette = np.array([hex_to_rgb(color) for color in style.colors], dtype=np.uint8)
+char_index = np.arange(len(text))
 
-# Create rainbow wave effect
-for j, char in enumerate(text):
-color_idx = (i + j) % len(style.colors)
-char_width = draw.textlength(text[:j], font=font)
-draw.text((x + char_width, y), char, font=font, fill=style.colors[color_idx])
+# Only the character-to-color mapping rotates, so each of the len(palette)
+# distinct frames is one palette lookup and blend over the label map
+palette_frames = []
+for shift in range(len(palette)):
+frame = background.copy()
 
-frames.append(np.array(img))
+# Create rainbow wave effect
+char_colors = np.take(palette, (shift + char_index) % len(palette), axis=0)
+blend_mask(frame, coverage, x + dx, y + dy, np.take(char_colors, labels, axis=0))
+palette_frames.append(frame)
 
-return frames
+for i in (range(total_frames) if frame_range is None else frame_range):
+yield palette_frames[i % len(palette_frames)]
 
 def create_neon_effect(self, text: str, width: int, height: int,
-style: AnimationStyle, fps: int, duration: float) -> List[np.ndarray]:
-frames = []
+style: AnimationStyle, fps: int, duration: float,
+out: Optional[np.ndarray] = None) -> List[np.ndarray]:
+return self.collect_frames(self.iter_neon_effect(text, width, height, style, fps, duration), out)
+
+def iter_neon_effect(self, text: str, width: int, height: int,
+style: AnimationStyle, fps: int, duration: float,
+frame_range: Optional[range] = None) -> Iterator[np.ndarray]:
 total_frames = int(fps * duration)
 
-for i in range(total_frames):
-img, draw, font, (x, y) = self.create_base_frame(text, width, height, style)
+layout = self.get_layout(text, width, height, style)
+background = self.get_background(width, height, style)
+mask, (dx, dy) = self.get_atlas(width, height, style).text_mask(layout)
+x, y = layout.origin[0] + dx, layout.origin[1] + dy
+glow_mask, pad = create_glow_mask(mask, radius=max(1, round(3 * render_scale(width, height))))
+
+# Frames only differ by glow color, so render one frame per palette entry
+palette_frames = []
+for glow_color in style.colors:
+frame = background.copy()
 
 # Create glow effect
-glow_color = style.colors[i % len(style.colors)]
-for offset in range(3, 0, -1):
-draw.text((x-offset, y), text, font=font, fill=glow_color)
-draw.text((x+offset, y), text, font=font, fill=glow_color)
-draw.text((x, y-offset), text, font=font, fill=glow_color)
-draw.text((x, y+offset), text, font=font, fill=glow_color)
+blend_mask(frame, glow_mask, x - pad, y - pad, hex_to_rgb(glow_color))
 
 # Draw main text
-draw.text((x, y), text, font=font, fill='#FFFFFF')
-frames.append(np.array(img))
+blend_mask(frame, mask, x, y, (255, 255, 255))
+palette_frames.append(frame)
+
+for i in (range(total_frames) if frame_range is None else frame_range):
+yield palette_frames[i % len(palette_frames)]
+
+# Styles where every frame is distinct work; the others render a handful of frames
+# and repeat them, which a worker pool would only re-render and copy
+PARALLEL_STYLES = ('matrix',)
+
+@lru_cache(maxsize=None)
+def get_worker_animator() -> 'TextAnimator':
+"""Get the animator a render worker process reuses across chunks"""
+return TextAnimator()
+
+def worker_function(function: Callable) -> Callable:
+"""Return the copy of a function that worker processes can unpickle"""
+# Streamlit runs this file as __main__, which worker processes cannot look
+# functions up in, so hand them the importable module's copy instead
+if __name__ == '__main__':
+return getattr(importlib.import_module('text_animator'), function.__name__)
+return function
+
+def warm_worker(_=None) -> int:
+"""Build a worker process's animator ahead of its first chunk and return its pid"""
+get_worker_animator()
+return os.getpid()
+
+def render_chunk(text: str, style: str, fps: int, duration: float, resolution: Optional[str],
+start: int, stop: int, shm_name: str, shape: Tuple[int, ...]) -> int:
+"""Render frames [start, stop) of a job into a shared-memory slot; runs in a worker process"""
+slot = shared_memory.SharedMemory(name=shm_name)
+try:
+frames = np.ndarray(shape, dtype=np.uint8, buffer=slot.buf)
+chunk = get_worker_animator().create_frames_iter(
+text, style, fps, duration, resolution, frame_range=range(start, stop)
+)
+for index, frame in enumerate(chunk):
+frames[index] = frame
+del frames
+finally:
+slot.close()
+return stop - start
+
+@st.cache_resource
+def get_render_pool() -> ProcessPoolExecutor:
+"""Get the process-wide pool of render workers"""
+# Forking the threaded Streamlit server can copy held locks into the children, so
+# workers come from a fork server that has imported nothing but this module
+context = multiprocessing.get_context('forkserver')
+context.set_forkserver_preload(['text_animator'])
+return ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=context)
+
+render_pool_lock = threading.Lock()
+
+def reset_render_pool(broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+"""Replace a pool that a dead worker has broken and return the new one"""
+with render_pool_lock:
+# Another job may already have rebuilt it
+if get_render_pool() is broken:
+get_render_pool.clear()
+broken.shutdown(wait=False)
+return get_render_pool()
+
+def iter_frames_parallel(text: str, style: str, fps: int = 30, duration: float = 3.0,
+resolution: Optional[str] = None, workers: Optional[int] = None, chunk_size: Optional[int] = None,
+max_bytes: int = 1024 ** 3, executor: Optional[ProcessPoolExecutor] = None,
+frame_range: Optional[range] = None) -> Iterator[np.ndarray]:
+"""Render a job in chunks across worker processes and yield its frames in order"""
+width, height = RESOLUTIONS[resolution] if resolution else REFERENCE_RESOLUTION
+frame_range = range(int(fps * duration)) if frame_range is None else frame_range
+total_frames = len(frame_range)
+workers = workers or os.cpu_count() or 1
+shared_pool = executor is None
+executor = executor or get_render_pool()
+frame_bytes = height * width * 3
+
+# Chunks only depend on the job, never on scheduling, and every frame is a pure
+# function of its index, so the output matches a serial render bit for bit.
+# One slot per worker plus one the caller drains; each chunk pays the job's setup
+# (layout, masks, rain tiles) again, so aim for two chunks per worker.
+slots = workers + 1
+if chunk_size is None:
+chunk_size = -(-total_frames // (2 * workers))
+chunk_size = max(1, min(chunk_size, max_bytes // (slots * frame_bytes)))
+chunks = [(start, min(start + chunk_size, frame_range.stop))
+for start in range(frame_range.start, frame_range.stop, chunk_size)]
+
+worker = worker_function(render_chunk)
+
+buffers = []
+pending = deque()
+restarted = False
+try:
+for _ in range(min(slots, len(chunks))):
+buffers.append(shared_memory.SharedMemory(create=True, size=chunk_size * frame_bytes))
+free = deque(buffers)
+next_chunk = 0
+
+def submit(index: int, slot: shared_memory.SharedMemory):
+start, stop = chunks[index]
+shape = (stop - start, height, width, 3)
+future = executor.submit(worker, text, style, fps, duration, resolution,
+start, stop, slot.name, shape)
+pending.append((index, future, slot, shape))
+
+def fill():
+nonlocal next_chunk
+while free and next_chunk < len(chunks):
+submit(next_chunk, free[0])
+free.popleft()
+next_chunk += 1
+
+def restart(error: BrokenProcessPool):
+# A worker died (OOM kill, crash) and broke the shared pool; rebuild it
+# once and rerun the chunks that were lost with it
+nonlocal executor, restarted
+if not shared_pool or restarted:
+raise error
+restarted = True
+executor = reset_render_pool(executor)
+lost = list(pending)
+pending.clear()
+for index, _, slot, _ in lost:
+submit(index, slot)
+
+ready = None
+while True:
+try:
+fill()
+except BrokenProcessPool as error:
+restart(error)
+continue
+if ready is not None:
+yield from ready
+ready = None
+if not pending:
+break
+
+index, future, slot, shape = pending[0]
+try:
+future.result()
+except BrokenProcessPool as error:
+restart(error)
+continue
+pending.popleft()
+
+# Copy out so the slot can be refilled while the caller still holds frames
+ready = np.ndarray(shape, dtype=np.uint8, buffer=slot.buf).copy()
+free.append(slot)
+finally:
+for _, future, _, _ in pending:
+future.cancel()
+wait([future for _, future, _, _ in pending])
+for slot in buffers:
+slot.close()
+slot.unlink()
+
+class PipelineStats:
+"""Per-stage busy, starved and blocked time for a staged frame pipeline"""
+
+def __init__(self):
+self.stages = OrderedDict()
+self.started = time.perf_counter()
+self.finished = None
+self.lock = threading.Lock()
+
+def add(self, stage: str, busy: float = 0.0, starved: float = 0.0, blocked: float = 0.0,
+frames: int = 0, queue_depth: Optional[int] = None):
+"""Record time a stage spent working, waiting for input and waiting on a full output queue"""
+with self.lock:
+entry = self.stages.setdefault(stage, {
+'frames': 0, 'busy': 0.0, 'starved': 0.0, 'blocked': 0.0, 'depth_total': 0, 'depth_samples': 0
+})
+entry['frames'] += frames
+entry['busy'] += busy
+entry['starved'] += starved
+entry['blocked'] += blocked
+if queue_depth is not None:
+entry['depth_total'] += queue_depth
+entry['depth_samples'] += 1
+
+def finish(self):
+"""Stop the wall clock"""
+self.finished = time.perf_counter()
+
+def stats(self) -> Dict:
+"""Return each stage's occupancy (busy share of wall time); the busiest stage is the bottleneck"""
+wall = (self.finished or time.perf_counter()) - self.started
+with self.lock:
+stages = {
+name: {
+'frames': entry['frames'],
+'busy_s': round(entry['busy'], 3),
+'starved_s': round(entry['starved'], 3),
+'blocked_s': round(entry['blocked'], 3),
+'occupancy': round(entry['busy'] / wall, 3) if wall > 0 else 0.0,
+'mean_input_queue': round(entry['depth_total'] / entry['depth_samples'], 2)
+if entry['depth_samples'] else None
+}
+for name, entry in self.stages.items()
+}
+bottleneck = max(stages, key=lambda name: stages[name]['busy_s']) if stages else None
+return {'wall_s': round(wall, 3), 'bottleneck': bottleneck, 'stages': stages}
+
+def iter_pipeline(frames: Iterator, stages: List[Tuple[str, Callable]], queue_size: int = 8,
+stats: Optional[PipelineStats] = None, source: str = 'render', sink: str = 'encode') -> Iterator:
+"""Run a frame iterator and each stage in its own thread, linked by bounded queues; the caller's loop is the sink stage"""
+stats = stats or PipelineStats()
+queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+stop = threading.Event()
+done = object()
+
+def put(output: queue.Queue, item) -> bool:
+# Block while the next stage is behind, but give up once the pipeline is shut down
+while not stop.is_set():
+try:
+output.put(item, timeout=0.1)
+return True
+except queue.Full:
+pass
+return False
+
+def get(input: queue.Queue):
+while not stop.is_set():
+try:
+return input.get(timeout=0.1)
+except queue.Empty:
+pass
+return done
+
+def produce(output: queue.Queue):
+items = iter(frames)
+try:
+while True:
+start = time.perf_counter()
+try:
+item = next(items)
+except StopIteration:
+break
+ready = time.perf_counter()
+ok = put(output, item)
+stats.add(source, busy=ready - start, blocked=time.perf_counter() - ready, frames=1)
+if not ok:
+return
+put(output, done)
+except BaseException as e:
+put(output, e)
+
+def transform(name: str, function: Callable, input: queue.Queue, output: queue.Queue):
+while True:
+start = time.perf_counter()
+depth = input.qsize()
+item = get(input)
+if item is done or isinstance(item, BaseException):
+put(output, item)
+return
+received = time.perf_counter()
+try:
+result = function(item)
+except BaseException as e:
+put(output, e)
+return
+ready = time.perf_counter()
+ok = put(output, result)
+stats.add(name, busy=ready - received, starved=received - start,
+blocked=time.perf_counter() - ready, frames=1, queue_depth=depth)
+if not ok:
+return
+
+threads = [threading.Thread(target=produce, args=(queues[0],), name=f"{source}-stage", daemon=True)]
+for index, (name, function) in enumerate(stages):
+threads.append(threading.Thread(target=transform, args=(name, function, queues[index], queues[index + 1]),
+name=f"{name}-stage", daemon=True))
+for thread in threads:
+thread.start()
+
+try:
+while True:
+start = time.perf_counter()
+depth = queues[-1].qsize()
+item = queues[-1].get()
+if item is done:
+return
+if isinstance(item, BaseException):
+raise item
+received = time.perf_counter()
+yield item
+stats.add(sink, busy=time.perf_counter() - received, starved=received - start,
+frames=1, queue_depth=depth)
+finally:
+stop.set()
+for thread in threads:
+thread.join()
+stats.finish()
+
+def rgb_to_yuv420p(frame: np.ndarray) -> np.ndarray:
+"""Convert an (H, W, 3) RGB frame to planar BT.601 limited-range YUV 4:2:0, shaped (H * 3 / 2, W)"""
+height, width, _ = frame.shape
+out = np.empty((height * 3 // 2, width), dtype=np.uint8)
+rgb = frame.astype(np.uint16)
+
+# Integer BT.601 weights scaled by 256, accumulated in place to keep temporaries down
+luma = rgb[..., 0] * 66
+luma += rgb[..., 1] * 129
+luma += rgb[..., 2] * 25
+luma += 128
+luma >>= 8
+luma += 16
+out[:height] = luma
+
+# Chroma from the sum of each 2x2 block, so the extra /4 folds into the shift
+quad = rgb[0::2, 0::2] + rgb[1::2, 0::2]
+quad += rgb[0::2, 1::2]
+quad += rgb[1::2, 1::2]
+quad = quad.astype(np.int32)
+r, g, b = quad[..., 0], quad[..., 1], quad[..., 2]
+planes = out[height:].reshape(2, height // 2, width // 2)
+planes[0] = ((b * 112 - r * 38 - g * 74 + 512) >> 10) + 128
+planes[1] = ((r * 112 - g * 94 - b * 18 + 512) >> 10) + 128
+return out
+
+class ColorConverter:
+"""Pipeline stage converting RGB frames to yuv420p, once per distinct frame array"""
+
+def __init__(self, max_bytes: int = 128 * 1024 ** 2):
+self.max_bytes = max_bytes
+self.cache = {}
+self.bytes = 0
+self.converted = 0
+self.reused = 0
+# Reentrant, as a frame can be freed, and its entry released, while the lock is held
+self.lock = threading.RLock()
+
+def __call__(self, frame: np.ndarray) -> np.ndarray:
+# Effects yield a repeated frame as the same array and keep it alive only while
+# they may yield it again, so an entry lives exactly as long as its source frame:
+# bounce keeps one period, typewriter its current prefix, matrix nothing
+key = id(frame)
+with self.lock:
+entry = self.cache.get(key)
+if entry is not None and entry[0]() is frame:
+self.reused += 1
+return entry[1]
+
+converted = rgb_to_yuv420p(frame)
+with self.lock:
+self.converted += 1
+# Past the byte budget, new frames are converted without being kept; evicting old
+# ones instead would miss on every frame of a period longer than the cache
+if self.bytes + converted.nbytes <= self.max_bytes:
+self.cache[key] = (weakref.ref(frame, self._release(key)), converted)
+self.bytes += converted.nbytes
+return converted
+
+def _release(self, key: int) -> Callable:
+def release(ref):
+# Runs when the source frame is freed, in whichever thread dropped it last
+with self.lock:
+entry = self.cache.get(key)
+if entry is not None and entry[0] is ref:
+del self.cache[key]
+self.bytes -= entry[1].nbytes
+return release
+
+# x264 settings per Quality setting, from fastest/largest to slowest/smallest
+ENCODER_PROFILES = {
+'Preview': {'preset': 'ultrafast', 'crf': 30, 'tune': 'animation', 'gop_seconds': 10},
+'Low': {'preset': 'veryfast', 'crf': 28, 'tune': 'animation', 'gop_seconds': 5},
+'Medium': {'preset': 'medium', 'crf': 23, 'tune': 'animation', 'gop_seconds': 5},
+'High': {'preset': 'slow', 'crf': 19, 'tune': 'animation', 'gop_seconds': 2},
+'Archival': {'preset': 'veryslow', 'crf': 14, 'tune': 'animation', 'gop_seconds': 2}
+}
+
+def gop_frames(profile: str, fps: int) -> int:
+"""Return the keyframe interval of an encoder profile in frames"""
+return max(1, int(ENCODER_PROFILES[profile]['gop_seconds'] * fps))
+
+def encoder_args(profile: str, fps: int, threads: int = 0) -> List[str]:
+"""Return the ffmpeg output arguments for an encoder profile; threads=0 lets x264 use every core"""
+settings = ENCODER_PROFILES[profile]
+return [
+'-preset', settings['preset'],
+'-crf', str(settings['crf']),
+'-tune', settings['tune'],
+'-g', str(gop_frames(profile, fps)),
+'-threads', str(threads)
+]
+
+@lru_cache(maxsize=None)
+def get_ffmpeg_binary() -> Optional[str]:
+"""Find an ffmpeg executable once per process: $FFMPEG_BINARY, then PATH, then the one bundled with imageio"""
+binary = os.environ.get('FFMPEG_BINARY') or shutil.which('ffmpeg')
+if binary:
+return binary
+try:
+import imageio_ffmpeg
+return imageio_ffmpeg.get_ffmpeg_exe()
+except (ImportError, RuntimeError):
+return None
+
+class FFmpegPipeWriter:
+"""Encode RGB frames by piping raw bytes into one long-lived ffmpeg process"""
+
+# F_SETPIPE_SZ from <fcntl.h>; Linux only
+PIPE_SIZE_FLAG = 1031
+
+def __init__(self, output_path: str, size: Tuple[int, int], fps: int, codec: str = 'libx264',
+ffmpeg_params: Optional[List[str]] = None, ffmpeg_binary: Optional[str] = None,
+pipe_size: int = 1024 * 1024, input_pix_fmt: str = 'rgb24'):
+binary = ffmpeg_binary or get_ffmpeg_binary()
+if binary is None:
+raise FileNotFoundError("ffmpeg executable not found")
+
+width, height = size
+command = [
+binary, '-y', '-loglevel', 'error',
+'-f', 'rawvideo', '-vcodec', 'rawvideo', '-pix_fmt', input_pix_fmt,
+'-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
+'-an', '-vcodec', codec, '-pix_fmt', 'yuv420p',
+*(ffmpeg_params or []),
+output_path
+]
+self.frame_shape = (height * 3 // 2, width) if input_pix_fmt == 'yuv420p' else (height, width, 3)
+self._stderr = tempfile.TemporaryFile()
+self.proc = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=self._stderr, bufsize=pipe_size)
+
+# A bigger kernel pipe buffer lets us hand over whole frames per syscall
+try:
+import fcntl
+fcntl.fcntl(self.proc.stdin.fileno(), self.PIPE_SIZE_FLAG, pipe_size)
+except (ImportError, OSError):
+pass
+
+def write_frame(self, frame: np.ndarray):
+"""Send one uint8 frame, (H, W, 3) RGB or (H * 3 / 2, W) yuv420p, to the encoder"""
+if frame.shape != self.frame_shape:
+raise ValueError(f"Expected frame of shape {self.frame_shape}, got {frame.shape}")
+try:
+self.proc.stdin.write(memoryview(np.ascontiguousarray(frame, dtype=np.uint8)).cast('B'))
+except BrokenPipeError:
+self.close()
+raise
+
+def close(self):
+"""Flush the pipe, wait for ffmpeg and raise if it failed"""
+if self._stderr.closed:
+return
+if not self.proc.stdin.closed:
+try:
+self.proc.stdin.close()
+except BrokenPipeError:
+pass
+returncode = self.proc.wait()
+self._stderr.seek(0)
+errors = self._stderr.read().decode(errors='replace')
+self._stderr.close()
+if returncode != 0:
+raise IOError(f"ffmpeg exited with code {returncode}: {errors.strip()}")
+
+def __enter__(self):
+return self
+
+def __exit__(self, *exc):
+self.close()
+
+class MoviePyWriter:
+"""Fallback encoder with the FFmpegPipeWriter API, backed by moviepy's ffmpeg writer"""
+
+def __init__(self, output_path: str, size: Tuple[int, int], fps: int, codec: str = 'libx264',
+ffmpeg_params: Optional[List[str]] = None):
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+self.writer = FFMPEG_VideoWriter(output_path, size, fps, codec=codec, ffmpeg_params=ffmpeg_params)
+
+def write_frame(self, frame: np.ndarray):
+"""Send one (H, W, 3) uint8 frame to the encoder"""
+self.writer.write_frame(frame)
+
+def close(self):
+"""Finish the file"""
+self.writer.close()
+
+def __enter__(self):
+return self
+
+def __exit__(self, *exc):
+self.close()
+
+def open_video_writer(output_path: str, size: Tuple[int, int], fps: int, codec: str = 'libx264',
+backend: str = 'auto', ffmpeg_params: Optional[List[str]] = None, input_pix_fmt: str = 'rgb24'):
+"""Open a frame writer: 'ffmpeg' pipes raw frames, 'moviepy' is the fallback, 'auto' picks ffmpeg when found"""
+if backend == 'auto':
+backend = 'ffmpeg' if get_ffmpeg_binary() else 'moviepy'
+if backend == 'ffmpeg':
+return FFmpegPipeWriter(output_path, size, fps, codec=codec, ffmpeg_params=ffmpeg_params,
+input_pix_fmt=input_pix_fmt)
+if backend == 'moviepy':
+if input_pix_fmt != 'rgb24':
+raise ValueError("The moviepy encoder only accepts rgb24 frames")
+return MoviePyWriter(output_path, size, fps, codec=codec, ffmpeg_params=ffmpeg_params)
+raise ValueError(f"Unknown encoder backend: {backend}")
+
+def encode_frames(frames: Iterator[np.ndarray], output_path: str, fps: int, codec: str = 'libx264',
+queue_size: int = 8, backend: str = 'auto', profile: Optional[str] = None,
+ffmpeg_params: Optional[List[str]] = None, stats: Optional[PipelineStats] = None,
+color_stage: Optional[bool] = None, threads: int = 0) -> int:
+"""Render, color-convert and encode frames concurrently and return how many were written"""
+ffmpeg_params = (encoder_args(profile, fps, threads) if profile else []) + (ffmpeg_params or []) or None
+if backend == 'auto':
+backend = 'ffmpeg' if get_ffmpeg_binary() else 'moviepy'
+
+# With the pipe encoder, yuv420p conversion can run as its own stage and halve the bytes
+# piped; it only pays off when that stage gets a core of its own
+if color_stage is None:
+color_stage = (os.cpu_count() or 1) > 1
+convert = color_stage and backend == 'ffmpeg'
+stages = [('convert', ColorConverter())] if convert else []
+
+writer = None
+count = 0
+try:
+for frame in iter_pipeline(frames, stages, queue_size, stats):
+if writer is None:
+size = (frame.shape[1], frame.shape[0] * 2 // 3) if convert else (frame.shape[1], frame.shape[0])
+writer = open_video_writer(output_path, size, fps, codec, backend, ffmpeg_params,
+input_pix_fmt='yuv420p' if convert else 'rgb24')
+writer.write_frame(frame)
+count += 1
+finally:
+if writer is not None:
+writer.close()
+return count
+
+# Jobs at least this long (seconds) encode in parallel segments
+SEGMENT_MIN_DURATION = 8
+
+def segment_ranges(total_frames: int, gop: int, segments: int) -> List[range]:
+"""Split a timeline into at most `segments` frame ranges whose lengths are whole GOPs"""
+gops = -(-total_frames // gop)
+gops_per_segment = -(-gops // max(1, segments))
+length = gops_per_segment * gop
+return [range(start, min(start + length, total_frames)) for start in range(0, total_frames, length)]
+
+def concat_videos(paths: List[str], output_path: str, output_params: Optional[List[str]] = None,
+ffmpeg_binary: Optional[str] = None):
+"""Join videos with identical encoding settings using the concat demuxer, without re-encoding"""
+binary = ffmpeg_binary or get_ffmpeg_binary()
+if binary is None:
+raise FileNotFoundError("ffmpeg executable not found")
+
+with tempfile.NamedTemporaryFile('w', suffix='.txt', dir=os.path.dirname(paths[0])) as playlist:
+for path in paths:
+escaped = path.replace("'", "'\\''")
+playlist.write(f"file '{escaped}'\n")
+playlist.flush()
+
+command = [
+binary, '-y', '-loglevel', 'error',
+'-f', 'concat', '-safe', '0', '-i', playlist.name,
+'-c', 'copy', '-movflags', '+faststart',
+*(output_params or []),
+output_path
+]
+result = subprocess.run(command, stdin=subprocess.DEVNULL, stderr=subprocess.PIPE)
+if result.returncode != 0:
+errors = result.stderr.decode(errors='replace').strip()
+raise IOError(f"ffmpeg exited with code {result.returncode}: {errors}")
+
+def encode_segments(render_range: Callable[[range], Iterator[np.ndarray]], total_frames: int,
+output_path: str, fps: int, codec: str = 'libx264', profile: str = 'Medium',
+segments: Optional[int] = None, ffmpeg_params: Optional[List[str]] = None,
+output_params: Optional[List[str]] = None, stats: Optional[PipelineStats] = None) -> int:
+"""Encode GOP-aligned segments in parallel ffmpeg processes, then concatenate them losslessly"""
+cores = os.cpu_count() or 1
+segments = segments or cores
+ranges = segment_ranges(total_frames, gop_frames(profile, fps), segments)
+
+# A job shorter than two GOPs has nothing to split; encode it directly rather than
+# through a scratch file and a second (concat) pass
+if len(ranges) == 1:
+return encode_frames(render_range(ranges[0]), output_path, fps, codec, backend='ffmpeg', profile=profile,
+ffmpeg_params=(ffmpeg_params or []) + (output_params or []), stats=stats)
+
+# Split the cores between the encoders instead of letting each one start a thread per core
+threads = max(1, cores // len(ranges))
+
+# Segments are scratch files, so keep them on tmpfs when it is available
+scratch_root = '/dev/shm' if os.access('/dev/shm', os.W_OK) else None
+with tempfile.TemporaryDirectory(prefix='segments_', dir=scratch_root) as scratch:
+paths = [os.path.join(scratch, f"segment_{index:04d}.mp4") for index in range(len(ranges))]
+
+# Each segment starts on a keyframe in its own encoder, so the joined stream
+# keeps the same keyframe cadence as a single encode
+with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix='segment') as executor:
+futures = [
+executor.submit(encode_frames, render_range(frame_range), path, fps, codec,
+backend='ffmpeg', profile=profile, ffmpeg_params=ffmpeg_params,
+stats=stats, threads=threads)
+for frame_range, path in zip(ranges, paths)
+]
+count = sum(future.result() for future in futures)
+
+concat_videos(paths, output_path, output_params)
+return count
+
+# Jobs whose encoded output may exceed this go to the artifact store instead of memory
+MEMORY_SINK_MAX_BYTES = 256 * 1024 ** 2
+
+class MemorySink:
+"""Encoder output held in an anonymous in-memory file (memfd), so it never touches disk"""
+
+# The path has no extension for ffmpeg to guess the container from
+ffmpeg_params = ['-f', 'mp4']
+
+def __init__(self, name: str = 'text_animation.mp4'):
+self.fd = os.memfd_create(name)
+self.path = f"/proc/{os.getpid()}/fd/{self.fd}"
+
+def result(self) -> bytes:
+"""Return the encoded video"""
+return os.pread(self.fd, os.fstat(self.fd).st_size, 0)
+
+def close(self):
+"""Release the memory"""
+if self.fd is not None:
+os.close(self.fd)
+self.fd = None
+
+def __enter__(self):
+return self
+
+def __exit__(self, *exc):
+self.close()
+
+class TmpfsSink:
+"""Encoder output in a temporary file on tmpfs (/dev/shm) when available"""
+
+ffmpeg_params = []
+
+def __init__(self, directory: Optional[str] = None):
+if directory is None and os.access('/dev/shm', os.W_OK):
+directory = '/dev/shm'
+fd, self.path = tempfile.mkstemp(suffix='.mp4', dir=directory)
+os.close(fd)
+
+def result(self) -> bytes:
+"""Return the encoded video"""
+with open(self.path, 'rb') as f:
+return f.read()
+
+def close(self):
+"""Delete the file"""
+try:
+os.remove(self.path)
+except FileNotFoundError:
+pass
 
-return frames
+def __enter__(self):
+return self
+
+def __exit__(self, *exc):
+self.close()
+
+class ArtifactSink:
+"""Encoder output written straight into an ArtifactStore and kept after the job"""
+
+ffmpeg_params = []
+
+def __init__(self, path: str, store: Optional['ArtifactStore'] = None):
+self.path = path
+self.store = store
+
+def result(self) -> str:
+"""Return the stored file's path, which st.video streams from disk"""
+return self.path
+
+def close(self, keep: bool = True):
+"""Keep the file, or delete it when the job failed"""
+if not keep:
+try:
+os.remove(self.path)
+except FileNotFoundError:
+pass
+if self.store is not None:
+self.store.release(self.path)
+self.store = None
+
+def __enter__(self):
+return self
+
+def __exit__(self, exc_type, *exc):
+self.close(keep=exc_type is None)
+
+class ArtifactStore:
+"""Directory of finished videos that outlive the job that made them, oldest evicted within a byte budget"""
+
+def __init__(self, root: Optional[str] = None, max_bytes: int = 2 * 1024 ** 3):
+self.root = Path(root or Path.home() / '.cache' / 'text_animator' / 'videos')
+self.root.mkdir(parents=True, exist_ok=True)
+self.max_bytes = max_bytes
+self.lock = threading.Lock()
+self.active = set()
+self.evictions = 0
+
+def sink(self, suffix: str = '.mp4') -> ArtifactSink:
+"""Open a sink for a new artifact"""
+fd, path = tempfile.mkstemp(suffix=suffix, prefix='video_', dir=self.root)
+os.close(fd)
+with self.lock:
+self.active.add(path)
+return ArtifactSink(path, self)
+
+def release(self, path: str):
+"""Mark an artifact's encode as finished, then trim the store to its budget"""
+with self.lock:
+self.active.discard(path)
+self._evict()
+
+def _files(self) -> List[Tuple[float, int, Path]]:
+files = []
+for path in self.root.iterdir():
+try:
+stat = path.stat()
+except FileNotFoundError:
+continue
+files.append((stat.st_mtime, stat.st_size, path))
+return sorted(files)
+
+def _evict(self):
+# Caller holds the lock; artifacts still being encoded are never evicted
+files = self._files()
+total = sum(size for _, size, _ in files)
+for _, size, path in files:
+if total <= self.max_bytes:
+break
+if str(path) in self.active:
+continue
+try:
+path.unlink()
+except FileNotFoundError:
+pass
+total -= size
+self.evictions += 1
+
+def stats(self) -> Dict:
+"""Return the number and total size of stored artifacts"""
+with self.lock:
+sizes = [size for _, size, _ in self._files()]
+return {'artifacts': len(sizes), 'bytes': sum(sizes), 'max_bytes': self.max_bytes,
+'evictions': self.evictions, 'root': str(self.root)}
+
+@st.cache_resource
+def get_artifact_store() -> ArtifactStore:
+"""Get the process-wide artifact store"""
+return ArtifactStore()
+
+def open_output_sink(encoded_bytes: int, store: Optional[ArtifactStore] = None):
+"""Pick where an encode goes by its expected size: memory for small videos, the artifact store for large ones"""
+if encoded_bytes > MEMORY_SINK_MAX_BYTES:
+return (store or get_artifact_store()).sink()
+try:
+return MemorySink()
+except (AttributeError, OSError):
+# memfd_create is Linux only
+return TmpfsSink()
+
+def place_file(source: Union[str, Path], destination: Union[str, Path], move: bool = False):
+"""Put a finished video at destination by renaming (move) or hard-linking it, copying only across filesystems"""
+# Finished videos are only ever replaced, never rewritten in place, so a link is as good as a copy
+try:
+if move:
+os.replace(source, destination)
+return
+if os.path.exists(destination):
+os.remove(destination)
+os.link(source, destination)
+except OSError:
+shutil.copyfile(source, destination)
+if move:
+os.remove(source)
+
+def load_video(video) -> bytes:
+"""Return video bytes from either in-memory bytes or an artifact path"""
+if isinstance(video, str):
+with open(video, 'rb') as f:
+return f.read()
+return video
+
+@lru_cache(maxsize=32)
+def file_digest(path: str, mtime: float) -> str:
+"""Hash a file's contents; mtime is part of the cache key so edits are picked up"""
+digest = hashlib.sha256()
+with open(path, 'rb') as f:
+for block in iter(lambda: f.read(1024 * 1024), b''):
+digest.update(block)
+return digest.hexdigest()
+
+def render_key(text: str, style: AnimationStyle, fps: int, duration: float, resolution: Optional[str],
+quality: Optional[str], font_file: Optional[str] = None, audio: Optional[str] = None) -> str:
+"""Return a stable hash of every input that determines a finished video; font_file None means PIL's default font"""
+font = None
+if font_file is not None:
+try:
+font = file_digest(font_file, os.path.getmtime(font_file))
+except OSError:
+# Gone since it was loaded; the path still tells it apart from the default font
+font = font_file
+inputs = {
+'renderer': RENDERER_VERSION,
+'text': text,
+'style': asdict(style),
+'fps': fps,
+'duration': duration,
+'resolution': resolution,
+'quality': quality,
+'encoder': ENCODER_PROFILES.get(quality),
+'font': font,
+'audio': audio
+}
+encoded = json.dumps(inputs, sort_keys=True, ensure_ascii=False).encode()
+return hashlib.sha256(encoded).hexdigest()
+
+class RenderCache:
+"""Content-addressed store of finished videos on local disk, evicted LRU within a byte budget"""
+
+def __init__(self, root: Optional[str] = None, max_bytes: int = 1024 ** 3, max_inline_bytes: int = 32 * 1024 ** 2):
+self.root = Path(root or Path.home() / '.cache' / 'text_animator' / 'renders')
+self.root.mkdir(parents=True, exist_ok=True)
+self.max_bytes = max_bytes
+self.max_inline_bytes = max_inline_bytes
+self.lock = threading.Lock()
+self.hits = 0
+self.misses = 0
+self.evictions = 0
+
+# Rebuild recency order from mtimes, which get() refreshes on every hit
+entries = sorted((path.stat().st_mtime, path.stem, path.stat().st_size)
+for path in self.root.glob('*.mp4'))
+self.entries = OrderedDict((key, size) for _, key, size in entries)
+self.total_bytes = sum(self.entries.values())
+self._evict()
+
+def _path(self, key: str) -> Path:
+return self.root / f"{key}.mp4"
+
+def get(self, key: str) -> Optional[Union[bytes, str]]:
+"""Return a cached video and mark it recently used, or None; large videos come back as a path"""
+with self.lock:
+if key not in self.entries:
+self.misses += 1
+return None
+self.entries.move_to_end(key)
+self.hits += 1
+size = self.entries[key]
+path = self._path(key)
+try:
+data = path.read_bytes() if size <= self.max_inline_bytes else str(path)
+os.utime(path)
+except FileNotFoundError:
+# Removed behind our back
+with self.lock:
+self.total_bytes -= self.entries.pop(key, 0)
+self.hits -= 1
+self.misses += 1
+return None
+return data
+
+def path(self, key: str) -> Optional[str]:
+"""Return the file behind a cached video, for stores that hard-link it, or None"""
+with self.lock:
+if key not in self.entries:
+return None
+path = self._path(key)
+return str(path) if path.exists() else None
+
+def put(self, key: str, video, move: bool = False) -> Path:
+"""Store video bytes or a video file under key; move=True takes the file over instead of copying it"""
+path = self._path(key)
+fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.root)
+try:
+if isinstance(video, (str, Path)):
+os.close(fd)
+place_file(video, tmp_path, move)
+else:
+with os.fdopen(fd, 'wb') as f:
+f.write(video)
+# Readers only ever see complete files
+os.replace(tmp_path, path)
+except BaseException:
+if os.path.exists(tmp_path):
+os.remove(tmp_path)
+raise
+
+size = path.stat().st_size
+with self.lock:
+self.total_bytes += size - self.entries.pop(key, 0)
+self.entries[key] = size
+self._evict(keep=key)
+return path
+
+def _evict(self, keep: Optional[str] = None):
+# Caller holds the lock; the entry just stored is kept even if it alone is over budget
+while self.total_bytes > self.max_bytes and self.entries:
+key, size = next(iter(self.entries.items()))
+if key == keep:
+break
+del self.entries[key]
+self.total_bytes -= size
+self.evictions += 1
+try:
+self._path(key).unlink()
+except FileNotFoundError:
+pass
+
+def stats(self) -> Dict:
+"""Return cache counters and usage"""
+with self.lock:
+lookups = self.hits + self.misses
+return {
+'entries': len(self.entries),
+'bytes': self.total_bytes,
+'max_bytes': self.max_bytes,
+'hits': self.hits,
+'misses': self.misses,
+'evictions': self.evictions,
+'hit_ratio': self.hits / lookups if lookups else 0.0
+}
+
+@st.cache_resource
+def get_render_cache() -> RenderCache:
+"""Get the process-wide render cache"""
+return RenderCache()
+
+class SingleFlight:
+"""Run one call per key at a time; callers arriving while it runs wait for and share its result"""
+
+def __init__(self):
+self.lock = threading.Lock()
+self.calls: Dict[str, Future] = {}
+self.executed = 0
+self.shared = 0
+
+def do(self, key: str, function: Callable, *args, **kwargs):
+"""Call function unless a call for key is already in flight, then return that call's result"""
+with self.lock:
+future = self.calls.get(key)
+leader = future is None
+if leader:
+future = self.calls[key] = Future()
+self.executed += 1
+else:
+self.shared += 1
+
+if not leader:
+return future.result()
+
+try:
+result = function(*args, **kwargs)
+except BaseException as e:
+future.set_exception(e)
+raise
+else:
+future.set_result(result)
+return result
+finally:
+with self.lock:
+del self.calls[key]
+
+def stats(self) -> Dict:
+"""Return how many calls ran and how many callers shared an in-flight result"""
+with self.lock:
+return {'in_flight': len(self.calls), 'executed': self.executed, 'shared': self.shared}
+
+@st.cache_resource
+def get_render_flights() -> SingleFlight:
+"""Get the process-wide single-flight group for renders"""
+return SingleFlight()
+
+class HistoryStore:
+"""Generated videos kept on disk with their metadata indexed in SQLite, under per-session and global quotas"""
+
+def __init__(self, root: Optional[str] = None, max_session_bytes: int = 256 * 1024 ** 2,
+max_total_bytes: int = 2 * 1024 ** 3):
+self.root = Path(root or Path.home() / '.cache' / 'text_animator' / 'history')
+(self.root / 'videos').mkdir(parents=True, exist_ok=True)
+self.max_session_bytes = max_session_bytes
+self.max_total_bytes = max_total_bytes
+self.evictions = 0
+self.lock = threading.Lock()
+self.db = sqlite3.connect(str(self.root / 'history.db'), check_same_thread=False)
+with self.lock, self.db:
+self.db.execute(
+"CREATE TABLE IF NOT EXISTS history ("
+"id INTEGER PRIMARY KEY AUTOINCREMENT, session TEXT NOT NULL, timestamp TEXT NOT NULL, "
+"text TEXT NOT NULL, style TEXT NOT NULL, size INTEGER NOT NULL)"
+)
+self.db.execute("CREATE INDEX IF NOT EXISTS history_session ON history (session, id)")
+
+def _path(self, entry_id: int) -> Path:
+return self.root / 'videos' / f"{entry_id}.mp4"
+
+def add(self, session: str, text: str, style: str, video, timestamp: Optional[str] = None) -> Dict:
+"""Store video bytes or a video file and return the entry's lightweight reference"""
+timestamp = timestamp or time.strftime('%Y-%m-%d %H:%M:%S')
+fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.root / 'videos')
+try:
+if isinstance(video, (str, Path)):
+# Usually a render cache file, which is hard-linked rather than copied
+os.close(fd)
+place_file(video, tmp_path)
+else:
+with os.fdopen(fd, 'wb') as f:
+f.write(video)
+size = os.path.getsize(tmp_path)
+
+with self.lock:
+with self.db:
+cursor = self.db.execute(
+"INSERT INTO history (session, timestamp, text, style, size) VALUES (?, ?, ?, ?, ?)",
+(session, timestamp, text, style, size)
+)
+entry_id = cursor.lastrowid
+os.replace(tmp_path, self._path(entry_id))
+self._enforce_quotas(session)
+except BaseException:
+if os.path.exists(tmp_path):
+os.remove(tmp_path)
+raise
+return {'id': entry_id, 'timestamp': timestamp, 'text': text, 'style': style, 'size': size}
+
+def _over_quota(self, rows: List[Tuple[int, int]], max_bytes: int) -> List[int]:
+# rows are (id, size), newest first; the newest entry is always kept
+expired = []
+total = 0
+for index, (entry_id, size) in enumerate(rows):
+total += size
+if index > 0 and total > max_bytes:
+expired.append(entry_id)
+return expired
+
+def _enforce_quotas(self, session: str):
+# Caller holds the lock
+rows = self.db.execute(
+"SELECT id, size FROM history WHERE session = ? ORDER BY id DESC", (session,)
+).fetchall()
+self._delete(self._over_quota(rows, self.max_session_bytes))
+rows = self.db.execute("SELECT id, size FROM history ORDER BY id DESC").fetchall()
+self._delete(self._over_quota(rows, self.max_total_bytes))
+
+def _delete(self, entry_ids: List[int]):
+# Caller holds the lock
+if not entry_ids:
+return
+with self.db:
+self.db.executemany("DELETE FROM history WHERE id = ?", [(entry_id,) for entry_id in entry_ids])
+for entry_id in entry_ids:
+try:
+self._path(entry_id).unlink()
+except FileNotFoundError:
+pass
+self.evictions += len(entry_ids)
+
+def delete(self, entry_ids: List[int]):
+"""Remove entries and their videos"""
+with self.lock:
+self._delete(list(entry_ids))
+
+def entries(self, session: str) -> List[Dict]:
+"""Return a session's entries, oldest first, without their videos"""
+with self.lock:
+rows = self.db.execute(
+"SELECT id, timestamp, text, style, size FROM history WHERE session = ? ORDER BY id", (session,)
+).fetchall()
+return [dict(zip(('id', 'timestamp', 'text', 'style', 'size'), row)) for row in rows]
+
+def load(self, entry_id: int) -> bytes:
+"""Read an entry's video; raises FileNotFoundError once it has been evicted"""
+return self._path(entry_id).read_bytes()
+
+def stats(self) -> Dict:
+"""Return how much the store holds against its quotas"""
+with self.lock:
+entries, total, sessions = self.db.execute(
+"SELECT COUNT(*), COALESCE(SUM(size), 0), COUNT(DISTINCT session) FROM history"
+).fetchone()
+return {
+'entries': entries,
+'bytes': total,
+'sessions': sessions,
+'max_session_bytes': self.max_session_bytes,
+'max_total_bytes': self.max_total_bytes,
+'evictions': self.evictions
+}
+
+@st.cache_resource
+def get_history_store() -> HistoryStore:
+"""Get the process-wide history store"""
+return HistoryStore()
 
 def add_audio_background(video_path: str, audio_style: str) -> str:
 """Add background audio to the video"""
 # This is a placeholder - you would need to implement actual audio handling
 return video_path
 
+def render_video(animator: 'TextAnimator', text: str, style: str, fps: int, duration: float,
+resolution: str, quality: str, audio: Optional[str] = None, stats: Optional[PipelineStats] = None):
+"""Render and encode one video; small clips come back as bytes, large ones as an artifact path"""
+workers = os.cpu_count() or 1
+total_frames = int(fps * duration)
+
+# ffmpeg spends 10-15 ms of CPU per 720p frame and ~30 ms per 1080p frame whatever the
+# style (matrix is the most expensive), so long and 1080p jobs are encode-bound; split
+# them across encoders when they span more than one GOP
+ranges = []
+if workers > 1 and (resolution == '1080p' or duration >= SEGMENT_MIN_DURATION):
+ranges = segment_ranges(total_frames, gop_frames(quality, fps), workers)
+segmented = len(ranges) > 1
+
+# The quality setting's bitrate cap goes into the first (and only) encode
+processor = VideoProcessor(quality)
+rate_control = processor.encoder_params()
+
+# The bitrate cap bounds the encoded size, so small clips stay in memory and large ones go to the artifact store
+with open_output_sink(processor.max_encoded_bytes(duration)) as sink:
+if segmented:
+# Matrix also renders at ~30 ms a 1080p frame, so its segments share the worker
+# pool; the other styles ignore workers and render in their segment's thread
+segment_workers = max(1, workers // len(ranges))
+encode_segments(
+lambda frame_range: animator.create_frames_iter(
+text, style, fps=fps, duration=duration, resolution=resolution, frame_range=frame_range,
+workers=segment_workers
+),
+total_frames, sink.path, fps, profile=quality, segments=workers, ffmpeg_params=rate_control,
+output_params=sink.ffmpeg_params, stats=stats
+)
+else:
+# Generate frames lazily, encoding them as soon as they are rendered
+frames = animator.create_frames_iter(
+text, style, fps=fps, duration=duration, resolution=resolution, workers=workers
+)
+encode_frames(frames, sink.path, fps, profile=quality, ffmpeg_params=rate_control + sink.ffmpeg_params,
+stats=stats)
+
+# Add audio if selected
+if audio:
+sink.path = add_audio_background(sink.path, audio)
+
+return sink.result()
+
+def fetch_video(animator: 'TextAnimator', text: str, style: str, fps: int, duration: float,
+resolution: str, quality: str, audio: Optional[str] = None, stats: Optional[PipelineStats] = None):
+"""Return a cached video, or render it once however many sessions ask for it at the same time"""
+cache = get_render_cache()
+style_config = animator.styles[style]
+key = render_key(text, style_config, fps, duration, resolution, quality,
+font_file=animator.get_font_file(resolution, style_config), audio=audio)
+
+def load():
+video = cache.get(key)
+if video is None:
+video = render_video(animator, text, style, fps, duration, resolution, quality, audio, stats)
+if isinstance(video, bytes):
+cache.put(key, video)
+else:
+# Large renders land in the artifact store; the cache takes the file over
+video = str(cache.put(key, video, move=True))
+return video
+
+return get_render_flights().do(key, load)
+
+# Characters rasterized into every glyph atlas at startup
+WARM_CHARS = string.ascii_letters + string.digits + string.punctuation + ' ' + MATRIX_CHARS
+
+class RenderService:
+"""Process-wide renderer with fonts, glyph atlases, backgrounds, ffmpeg and workers kept warm"""
+
+def __init__(self, warm: bool = True):
+self.animator = TextAnimator()
+self.lock = threading.Lock()
+self.requests = 0
+self.startup = OrderedDict()
+self.ffmpeg_version = None
+self.workers = 1
+self.worker_error = None
+if warm:
+self.warm()
+
+def _timed(self, phase: str, function: Callable, *args):
+start = time.perf_counter()
+result = function(*args)
+self.startup[phase] = round(time.perf_counter() - start, 4)
+return result
+
+def warm(self):
+"""Load everything a first request would otherwise pay for, timing each phase"""
+sizes = [REFERENCE_RESOLUTION, *RESOLUTIONS.values()]
+styles = self.animator.styles.values()
+
+def atlases():
+for width, height in sizes:
+for style in styles:
+self.animator.get_atlas(width, height, style).add(WARM_CHARS)
+
+def backgrounds():
+for width, height in sizes:
+for style in styles:
+self.animator.get_background(width, height, style)
+
+def ffmpeg():
+binary = get_ffmpeg_binary()
+if binary is None:
+return None
+result = subprocess.run([binary, '-version'], stdin=subprocess.DEVNULL,
+stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+return result.stdout.decode(errors='replace').split('\n', 1)[0]
+
+def workers():
+count = os.cpu_count() or 1
+if count > 1:
+pool = get_render_pool()
+try:
+list(pool.map(worker_function(warm_worker), range(count)))
+except (BrokenProcessPool, OSError) as e:
+# A cold pool only costs the first parallel render its startup, so
+# never fail the page over it; the next render gets a fresh pool
+self.worker_error = f"{type(e).__name__}: {e}"
+reset_render_pool(pool)
+return count
+
+self._timed('fonts_and_atlases', atlases)
+self._timed('backgrounds', backgrounds)
+self.ffmpeg_version = self._timed('ffmpeg', ffmpeg)
+self.workers = self._timed('render_workers', workers)
+self._timed('caches', lambda: (get_render_cache(), get_render_flights(), get_artifact_store()))
+self.startup['total'] = round(sum(self.startup.values()), 4)
+
+def render(self, text: str, style: str, fps: int, duration: float, resolution: str, quality: str,
+audio: Optional[str] = None, stats: Optional[PipelineStats] = None):
+"""Return the video for a request, from the render cache or a shared render"""
+with self.lock:
+self.requests += 1
+return fetch_video(self.animator, text, style, fps, duration, resolution, quality, audio, stats)
+
+def cached_path(self, text: str, style: str, fps: int, duration: float, resolution: str, quality: str,
+audio: Optional[str] = None) -> Optional[str]:
+"""Return the render cache's file for a request, if it holds one"""
+style_config = self.animator.styles[style]
+key = render_key(text, style_config, fps, duration, resolution, quality,
+font_file=self.animator.get_font_file(resolution, style_config), audio=audio)
+return get_render_cache().path(key)
+
+def stats(self) -> Dict:
+"""Return startup timings and how many requests the service has handled"""
+return {
+'startup_s': dict(self.startup),
+'ffmpeg': self.ffmpeg_version,
+'ffmpeg_binary': get_ffmpeg_binary(),
+'worker_error': self.worker_error,
+'requests': self.requests
+}
+
+@st.cache_resource
+def get_render_service() -> RenderService:
+"""Get the process-wide render service, warming it on first use"""
+return RenderService()
+
 @st.cache_data
 def get_font_list() -> List[str]:
 """Get list of available fonts"""
@@ -213,12 +2090,28 @@ page_icon="🎬",
 layout="wide"
 )
 
+# Warm the shared renderer at startup rather than inside the first request
+get_render_service()
+
 st.title("🎬 Advanced Text to Video Generator")
 st.markdown("Transform your text into stunning animated videos!")
 
-# Initialize session state
+# Initialize session state; history holds references, the videos stay in the history store
+if 'session_id' not in st.session_state:
+st.session_state.session_id = uuid.uuid4().hex
 if 'history' not in st.session_state:
 st.session_state.history = []
+if 'cache_manager' not in st.session_state:
+st.session_state.cache_manager = CacheManager()
+
+# Apply the Settings tab budgets before anything renders, so shrinking one
+# takes effect at once and every append is checked against the current values
+cache_manager = st.session_state.cache_manager
+cache_manager.max_size = st.session_state.get('history_size', cache_manager.max_size)
+if 'history_megabytes' in st.session_state:
+cache_manager.max_bytes = st.session_state.history_megabytes * 1024 ** 2
+cache_manager.policy = st.session_state.get('history_policy', cache_manager.policy).lower()
+cache_manager.cleanup_old_entries()
 
 # Create tabs for different sections
 tab1, tab2, tab3 = st.tabs(["Create Video", "History", "Settings"])
@@ -256,8 +2149,9 @@ index=0
 
 quality = st.select_slider(
 "Quality",
-options=['Low', 'Medium', 'High'],
-value='Medium'
+options=list(ENCODER_PROFILES),
+value='Medium',
+help="Preview encodes fastest; Archival gives the best quality per byte"
 )
 
 # Audio settings
@@ -275,53 +2169,30 @@ if text_input:
 if st.button("Generate Video", type="primary"):
 with st.spinner("Creating your video..."):
 try:
-# Initialize animator
-animator = TextAnimator()
-
-# Generate frames
-frames = animator.create_frames(
-text_input,
-style,
-fps=fps,
-duration=duration
-)
-
-# Create video
-with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as tmp_file:
-clip = ImageSequenceClip(frames, fps=fps)
-clip.write_videofile(
-tmp_file.name,
-fps=fps,
-codec='libx264',
-audio=False,
-verbose=False,
-logger=None
-)
-
-# Add audio if selected
-if add_audio and audio_style != 'None':
-tmp_file.name = add_audio_background(tmp_file.name, audio_style)
-
-# Read the video file
-with open(tmp_file.name, 'rb') as f:
-video_bytes = f.read()
-
-# Clean up
-os.unlink(tmp_file.name)
-
-# Add to history
-st.session_state.history.append({
-'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
-'text': text_input,
-'style': style,
-'video': video_bytes
-})
+audio = audio_style if add_audio and audio_style != 'None' else None
+
+# Identical requests are served from the render cache, and
+# concurrent ones share a single render
+pipeline_stats = PipelineStats()
+video_bytes = get_render_service().render(text_input, style, fps, duration,
+resolution, quality, audio,
+stats=pipeline_stats)
+if pipeline_stats.stages:
+st.session_state.pipeline_stats = pipeline_stats.stats()
+
+# Add to history, linking the render cache's file when there is one;
+# the cache manager evicts down to the history budgets
+cached = get_render_service().cached_path(text_input, style, fps, duration,
+resolution, quality, audio)
+entry = get_history_store().add(st.session_state.session_id, text_input, style,
+cached or video_bytes)
+cache_manager.append(entry)
 
 # Display video and download button
 st.video(video_bytes)
 st.download_button(
 "Download Video",
-video_bytes,
+load_video(video_bytes),
 f"text_animation_{style}.mp4",
 "video/mp4"
 )
@@ -334,16 +2205,27 @@ st.info("Enter some text to generate a video!")
 with tab2:
 # Display history
 if st.session_state.history:
-for idx, item in enumerate(reversed(st.session_state.history)):
+for idx, item in enumerate(list(reversed(st.session_state.history))):
 with st.expander(
 f"Video {len(st.session_state.history)-idx}: {item['style']} "
 f"({item['timestamp']})"
 ):
 st.text(f"Text: {item['text']}")
-st.video(item['video'])
+
+# Videos are only read from disk when an entry is opened; Streamlit reruns
+# the script on every interaction, so an open entry's video is read and
+# counted once, then held until it is hidden
+if not st.toggle("Show video", key=f"history_{item['id']}"):
+cache_manager.close(item['id'])
+else:
+video = cache_manager.open(item['id'])
+if video is None:
+st.warning("This video has expired from the history store.")
+else:
+st.video(video)
 st.download_button(
 f"Download Video {len(st.session_state.history)-idx}",
-item['video'],
+video,
 f"video_{item['style']}_{idx}.mp4",
 "video/mp4"
 )
@@ -356,7 +2238,20 @@ st.header("⚙️ Settings")
 # Cache settings
 cache_size = st.slider(
 "History Size (number of videos to keep)",
-1, 20, 10
+1, 20, 10,
+key='history_size'
+)
+st.slider(
+"History Size (MB of video to keep)",
+10, 1000, 200,
+key='history_megabytes'
+)
+st.radio(
+"History eviction",
+[policy.upper() for policy in CacheManager.POLICIES],
+horizontal=True,
+help="LRU drops the video opened longest ago, LFU the one opened least often",
+key='history_policy'
 )
 
 # Export/Import settings
@@ -386,6 +2281,26 @@ st.success("Settings imported successfully!")
 except Exception as e:
 st.error(f"Error importing settings: {str(e)}")
 
+# Renderer statistics
+with st.expander("Performance"):
+st.caption("Render service")
+st.json(get_render_service().stats())
+st.caption("Font cache")
+st.json(get_font_cache().stats())
+st.caption("Artifact store")
+st.json(get_artifact_store().stats())
+st.caption("Render cache")
+st.json(get_render_cache().stats())
+st.caption("History store")
+st.json(get_history_store().stats())
+st.caption("Session history")
+st.json(cache_manager.stats())
+st.caption("Concurrent renders")
+st.json(get_render_flights().stats())
+if 'pipeline_stats' in st.session_state:
+st.caption("Last render pipeline")
+st.json(st.session_state.pipeline_stats)
+
 # Instructions
 with st.expander("How to Use"):
 st.markdown("""
@@ -432,32 +2347,78 @@ class VideoProcessor:
 """Handle video processing and optimization"""
 
 def __init__(self, quality: str = 'Medium'):
+# One entry per encoder profile, so every Quality slider value is valid here
 self.quality_settings = {
+'Preview': {'bitrate': '500k', 'resolution': (640, 360)},
 'Low': {'bitrate': '1000k', 'resolution': (640, 360)},
 'Medium': {'bitrate': '2000k', 'resolution': (1280, 720)},
-'High': {'bitrate': '4000k', 'resolution': (1920, 1080)}
+'High': {'bitrate': '4000k', 'resolution': (1920, 1080)},
+'Archival': {'bitrate': '8000k', 'resolution': (1920, 1080)}
 }
+if quality not in ENCODER_PROFILES:
+raise ValueError(f"Unknown quality: {quality}")
 self.quality = quality
 
-def optimize_video(self, video_path: str) -> str:
-"""Optimize video based on quality settings"""
+def encoder_params(self) -> List[str]:
+"""Return ffmpeg_params that cap the bitrate, so the quality setting folds into the first encode"""
+bitrate = self.quality_settings[self.quality]['bitrate']
+buffer_size = f"{int(bitrate.rstrip('k')) * 2}k"
+return ['-maxrate', bitrate, '-bufsize', buffer_size]
+
+def max_encoded_bytes(self, duration: float) -> int:
+"""Return an upper bound on the encoded size of a clip under encoder_params' cap"""
+kilobits = int(self.quality_settings[self.quality]['bitrate'].rstrip('k'))
+# Rate plus one full buffer, with headroom for the container
+return int(kilobits * 1000 * (duration + 2) / 8 * 1.1)
+
+def optimize_video(self, video_path: str, output_path: Optional[str] = None) -> str:
+"""Scale and re-encode a video to the quality settings in a single ffmpeg pass"""
 settings = self.quality_settings[self.quality]
-output_path = f"{video_path}_optimized.mp4"
-
-clip = VideoFileClip(video_path)
-clip = clip.resize(settings['resolution'])
-
-clip.write_videofile(
-output_path,
-bitrate=settings['bitrate'],
-codec='libx264',
-audio=False,
-verbose=False,
-logger=None
-)
+output_path = output_path or f"{video_path}_optimized.mp4"
+binary = get_ffmpeg_binary()
+if binary is None:
+raise FileNotFoundError("ffmpeg executable not found")
+
+width, height = settings['resolution']
+command = [
+binary, '-y', '-loglevel', 'error', '-i', video_path,
+'-vf', f'scale={width}:{height}:flags=lanczos',
+'-an', '-vcodec', 'libx264', '-pix_fmt', 'yuv420p',
+'-b:v', settings['bitrate'], *self.encoder_params(),
+'-movflags', '+faststart',
+output_path
+]
+
+# Never leave a half-written file behind, whatever interrupts the encode
+try:
+result = subprocess.run(command, stdin=subprocess.DEVNULL, stderr=subprocess.PIPE)
+except BaseException:
+self.cleanup(output_path)
+raise
+if result.returncode != 0:
+self.cleanup(output_path)
+errors = result.stderr.decode(errors='replace').strip()
+raise IOError(f"ffmpeg exited with code {result.returncode}: {errors}")
 
 return output_path
 
+@contextmanager
+def optimized(self, video_path: str) -> Iterator[str]:
+"""Yield an optimized copy of the video and delete it when the block exits"""
+output_path = self.optimize_video(video_path)
+try:
+yield output_path
+finally:
+self.cleanup(output_path)
+
+@staticmethod
+def cleanup(path: str):
+"""Remove an output file if it exists"""
+try:
+os.remove(path)
+except FileNotFoundError:
+pass
+
 class AudioManager:
 """Handle background audio processing"""
 
@@ -493,17 +2454,99 @@ return output_path
 class CacheManager:
 """Handle caching and history management"""
 
-def __init__(self, max_size: int = 10):
+POLICIES = ('lru', 'lfu')
+
+def __init__(self, max_size: int = 10, max_bytes: Optional[int] = 200 * 1024 ** 2, policy: str = 'lru',
+store: Optional[HistoryStore] = None):
+if policy not in self.POLICIES:
+raise ValueError(f"Unknown eviction policy: {policy}")
 self.max_size = max_size
+self.max_bytes = max_bytes
+self.policy = policy
+self.store = store
+self.access = {}
+self.opened = {}
+self.hits = 0
+self.misses = 0
+self.evictions = 0
+self.evicted_bytes = 0
+
+def _store(self) -> HistoryStore:
+return self.store or get_history_store()
+
+def _bytes(self) -> int:
+return sum(item['size'] for item in st.session_state.history)
+
+def append(self, item: Dict):
+"""Add a history entry, then evict down to the budgets"""
+st.session_state.history.append(item)
+self.access[item['id']] = {'last_access': time.monotonic(), 'uses': 1}
+self.cleanup_old_entries()
+
+def get(self, entry_id: int) -> Optional[bytes]:
+"""Load an entry's video and count the access, or return None once it has expired"""
+try:
+video = self._store().load(entry_id)
+except FileNotFoundError:
+self.misses += 1
+st.session_state.history = [item for item in st.session_state.history if item['id'] != entry_id]
+self.access.pop(entry_id, None)
+self.opened.pop(entry_id, None)
+return None
+
+self.hits += 1
+usage = self.access.setdefault(entry_id, {'last_access': 0.0, 'uses': 0})
+usage['last_access'] = time.monotonic()
+usage['uses'] += 1
+return video
+
+def open(self, entry_id: int) -> Optional[bytes]:
+"""Return the video of an entry shown in the history, read and counted once when it is opened"""
+if entry_id in self.opened:
+return self.opened[entry_id]
+video = self.get(entry_id)
+if video is not None:
+self.opened[entry_id] = video
+return video
+
+def close(self, entry_id: int):
+"""Release a hidden entry's video, so showing it again reads and counts it anew"""
+self.opened.pop(entry_id, None)
+
+def _victim(self) -> Dict:
+# Least recently used, or least frequently used with ties going to the least recent.
+# The newest entry is never a candidate, like HistoryStore's quotas: under LFU it
+# always has the fewest uses, and a byte budget smaller than one clip would empty
+# the history, including the video just generated
+def rank(item):
+usage = self.access.get(item['id'], {'last_access': 0.0, 'uses': 0})
+if self.policy == 'lfu':
+return usage['uses'], usage['last_access']
+return usage['last_access']
+return min(st.session_state.history[:-1], key=rank)
 
 def cleanup_old_entries(self):
-"""Remove oldest entries when cache is full"""
-if len(st.session_state.history) > self.max_size:
-st.session_state.history = st.session_state.history[-self.max_size:]
+"""Evict entries until both the entry count and byte budgets are met, always keeping the newest"""
+history = st.session_state.history
+evicted = []
+while len(history) > 1 and (len(history) > self.max_size
+or (self.max_bytes is not None and self._bytes() > self.max_bytes)):
+victim = self._victim()
+history.remove(victim)
+self.access.pop(victim['id'], None)
+self.opened.pop(victim['id'], None)
+evicted.append(victim['id'])
+self.evictions += 1
+self.evicted_bytes += victim['size']
+if evicted:
+self._store().delete(evicted)
 
 def clear_cache(self):
 """Clear all cached videos"""
+self._store().delete([item['id'] for item in st.session_state.history])
 st.session_state.history = []
+self.access.clear()
+self.opened.clear()
 
 def export_history(self) -> str:
 """Export history as JSON"""
@@ -516,6 +2559,22 @@ history_data.append({
 })
 return json.dumps(history_data)
 
+def stats(self) -> Dict:
+"""Return budget usage, eviction and hit counters"""
+lookups = self.hits + self.misses
+return {
+'entries': len(st.session_state.history),
+'max_size': self.max_size,
+'bytes': self._bytes(),
+'max_bytes': self.max_bytes,
+'policy': self.policy,
+'evictions': self.evictions,
+'evicted_bytes': self.evicted_bytes,
+'hits': self.hits,
+'misses': self.misses,
+'hit_ratio': self.hits / lookups if lookups else 0.0
+}
+
 class SettingsManager:
 """Handle application settings"""
 